@@ -1,8 +1,12 @@
-from homeassistant.core import HomeAssistant
+import voluptuous as vol
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
 from homeassistant import config_entries
 from homeassistant.const import Platform
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.exceptions import ServiceValidationError
+from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers.typing import ConfigType
+from homeassistant.util import dt as dt_util
 
 # The domain of your component. Should be equal to the name of your component.
 from .const import (
@@ -20,6 +24,19 @@ from .core.cloud import Cloud
 from .core.grove_vision_ai import GroveVisionAI
 from .core.watcher import Watcher
 from .core.recamera import ReCamera
+from .core.event_index import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from .core.image_store import ImageStore
+from . import websocket_api
+
+SERVICE_GET_WATCHER_EVENTS = "get_watcher_events"
+GET_WATCHER_EVENTS_SCHEMA = vol.Schema({
+    vol.Optional("device_id"): cv.string,
+    vol.Optional("start_time"): cv.datetime,
+    vol.Optional("end_time"): cv.datetime,
+    vol.Optional("limit", default=DEFAULT_PAGE_SIZE): vol.All(
+        vol.Coerce(int), vol.Range(min=1, max=MAX_PAGE_SIZE)),
+    vol.Optional("cursor"): cv.string,
+})
 
 PLATFORMS = [Platform.CAMERA, Platform.SENSOR, Platform.NUMBER,
              Platform.SELECT, Platform.IMAGE, Platform.BUTTON, Platform.SWITCH]
@@ -28,6 +45,32 @@ PLATFORMS = [Platform.CAMERA, Platform.SENSOR, Platform.NUMBER,
 async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     """Set up the Sensecraft component."""
     hass.data.setdefault(DOMAIN, {})
+
+    def _timestamp(value):
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=dt_util.DEFAULT_TIME_ZONE)
+        return value.timestamp()
+
+    async def get_watcher_events(call: ServiceCall) -> ServiceResponse:
+        """Return a page of Watcher alarm events by device and time range."""
+        store = ImageStore(hass, hass.config.path('www/images'))
+        try:
+            return await store.async_query_events(
+                call.data.get("device_id"),
+                _timestamp(call.data.get("start_time")),
+                _timestamp(call.data.get("end_time")),
+                call.data["limit"],
+                call.data.get("cursor"),
+            )
+        except ValueError as e:
+            raise ServiceValidationError(str(e)) from e
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_GET_WATCHER_EVENTS, get_watcher_events,
+        schema=GET_WATCHER_EVENTS_SCHEMA, supports_response=SupportsResponse.ONLY)
+    websocket_api.async_setup(hass)
     return True
 
 
@@ -54,6 +97,7 @@ async def async_setup_entry(
 
     elif data_source == WATCHER:
         watcher = Watcher.from_config(hass, data.get(CONFIG_DATA))
+        await watcher.async_setup()
         data[WATCHER] = watcher
 
     elif data_source == RECAMERA:
@@ -91,10 +91,8 @@ class ReCameraButton(ButtonEntity):
 
     async def async_added_to_hass(self) -> None:
         """Run when entity about to be added to hass."""
-        self._event = self.hass.bus.async_listen(
-            f"sensecraft_recamera_{self._recamera.deviceId}_connection_state",
-            self._handle_connection_state
-        )
+        self._event = self._recamera.availability.async_add_listener(
+            self.async_write_ha_state)
 
     async def async_will_remove_from_hass(self) -> None:
         """Run when entity will be removed from hass."""
@@ -102,11 +100,6 @@ class ReCameraButton(ButtonEntity):
             self._event()
             self._event = None
 
-    def _handle_connection_state(self, event):
-        """Handle connection state changes."""
-        self._recamera.connected = event.data.get("connected", False)
-        self.hass.loop.call_soon_threadsafe(self.async_schedule_update_ha_state)
-
     async def async_press(self) -> None:
         """Handle the button press."""
         try:
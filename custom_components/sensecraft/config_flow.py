@@ -12,8 +12,13 @@ from homeassistant.data_entry_flow import FlowResult
 from .core.cloud import Cloud
 from .core.grove_vision_ai import GroveVisionAI
 from .core.recamera import ReCamera
+from .core.reconnect import ReconnectScheduler
 from .core.watcher import Watcher
 from homeassistant.helpers.selector import (
+    BooleanSelector,
+    NumberSelector,
+    NumberSelectorConfig,
+    NumberSelectorMode,
     SelectSelector,
     SelectSelectorConfig,
     SelectSelectorMode,
@@ -50,6 +55,32 @@ from .const import (
     CLOUD,
     CONFIG_DATA,
     DATA_SOURCE,
+    SERVER_MODE,
+    SERVER_MODE_STANDALONE,
+    SUPPORTED_SERVER_MODE,
+    CONTROL_TRANSPORT,
+    CONTROL_TRANSPORT_HTTP,
+    SUPPORTED_CONTROL_TRANSPORT,
+    STALL_MULTIPLIER,
+    DEFAULT_STALL_MULTIPLIER,
+    INGEST_WORKERS,
+    DEFAULT_INGEST_WORKERS,
+    IMAGE_FORMAT,
+    IMAGE_FORMAT_ORIGINAL,
+    SUPPORTED_IMAGE_FORMAT,
+    IMAGE_QUALITY,
+    DEFAULT_IMAGE_QUALITY,
+    DEDUP_PERCEPTUAL,
+    MAX_IMAGES,
+    DEFAULT_MAX_IMAGES,
+    RETENTION_DAYS,
+    DEFAULT_RETENTION_DAYS,
+    STORAGE_QUOTA,
+    STORAGE_QUOTA_TOTAL,
+    ALARM_WINDOW,
+    ALARM_IMAGES,
+    ALARM_IMAGES_ALL,
+    SUPPORTED_ALARM_IMAGES,
 )
 
 _LOGGER = logging.getLogger(__name__)
@@ -71,6 +102,58 @@ DEVICE_TYPE_SELECTOR = SelectSelector(
         mode=SelectSelectorMode.DROPDOWN,
     )
 )
+SERVER_MODE_SELECTOR = SelectSelector(
+    SelectSelectorConfig(
+        options=SUPPORTED_SERVER_MODE,
+        mode=SelectSelectorMode.DROPDOWN,
+        translation_key=SERVER_MODE,
+    )
+)
+CONTROL_TRANSPORT_SELECTOR = SelectSelector(
+    SelectSelectorConfig(
+        options=SUPPORTED_CONTROL_TRANSPORT,
+        mode=SelectSelectorMode.DROPDOWN,
+        translation_key=CONTROL_TRANSPORT,
+    )
+)
+STALL_MULTIPLIER_SELECTOR = NumberSelector(
+    NumberSelectorConfig(min=0, max=60, step=1, mode=NumberSelectorMode.BOX)
+)
+INGEST_WORKERS_SELECTOR = NumberSelector(
+    NumberSelectorConfig(min=1, max=8, step=1, mode=NumberSelectorMode.BOX)
+)
+IMAGE_FORMAT_SELECTOR = SelectSelector(
+    SelectSelectorConfig(
+        options=SUPPORTED_IMAGE_FORMAT,
+        mode=SelectSelectorMode.DROPDOWN,
+        translation_key=IMAGE_FORMAT,
+    )
+)
+IMAGE_QUALITY_SELECTOR = NumberSelector(
+    NumberSelectorConfig(min=10, max=100, step=1, mode=NumberSelectorMode.SLIDER)
+)
+MAX_IMAGES_SELECTOR = NumberSelector(
+    NumberSelectorConfig(min=1, max=1000000, step=1, mode=NumberSelectorMode.BOX)
+)
+RETENTION_DAYS_SELECTOR = NumberSelector(
+    NumberSelectorConfig(min=1, max=3650, step=1, mode=NumberSelectorMode.BOX,
+                         unit_of_measurement="d")
+)
+ALARM_WINDOW_SELECTOR = NumberSelector(
+    NumberSelectorConfig(min=0, max=3600, step=1, mode=NumberSelectorMode.BOX,
+                         unit_of_measurement="s")
+)
+ALARM_IMAGES_SELECTOR = SelectSelector(
+    SelectSelectorConfig(
+        options=SUPPORTED_ALARM_IMAGES,
+        mode=SelectSelectorMode.DROPDOWN,
+        translation_key=ALARM_IMAGES,
+    )
+)
+STORAGE_QUOTA_SELECTOR = NumberSelector(
+    NumberSelectorConfig(min=0, max=1048576, step=1, mode=NumberSelectorMode.BOX,
+                         unit_of_measurement="MB")
+)
 
 
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -94,7 +177,9 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         # Only return OptionsFlowHandler for ReCamera devices
         if config_entry.data.get(DATA_SOURCE) == RECAMERA:
             return OptionsFlowHandler(config_entry)
-        # Return a dummy options flow for non-ReCamera devices
+        if config_entry.data.get(DATA_SOURCE) == WATCHER:
+            return WatcherOptionsFlowHandler(config_entry)
+        # Return a dummy options flow for other devices
         return DummyOptionsFlowHandler(config_entry)
 
     async def async_step_user(
@@ -343,6 +428,7 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             # 获取用户输入的IP地址
             ip = user_input['device_host']
             device[DEVICE_HOST] = ip
+            device[SERVER_MODE] = user_input[SERVER_MODE]
             
             try:
                 # 创建临时ReCamera实例并测试连接
@@ -362,6 +448,8 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         fields: OrderedDict[Any, Any] = OrderedDict()
         fields[vol.Required('device_host', default=user_input.get(
             'device_host', ''))] = TEXT_SELECTOR
+        fields[vol.Required(SERVER_MODE, default=user_input.get(
+            SERVER_MODE, SERVER_MODE_STANDALONE))] = SERVER_MODE_SELECTOR
 
         return self.async_show_form(
             step_id="recamera_confirm",
@@ -408,6 +496,7 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             user_input = {}
         else:
             try:
+                device[SERVER_MODE] = user_input[SERVER_MODE]
                 local = Watcher(self.hass, device)
                 config = local.to_config()
                 return self.async_create_entry(title=name, data={
@@ -418,9 +507,13 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             except Exception:
                 errors["base"] = "setup_error"
 
+        fields: OrderedDict[Any, Any] = OrderedDict()
+        fields[vol.Required(SERVER_MODE, default=user_input.get(
+            SERVER_MODE, SERVER_MODE_STANDALONE))] = SERVER_MODE_SELECTOR
+
         return self.async_show_form(
             step_id="watcher_confirm",
-            data_schema=vol.Schema({}),
+            data_schema=vol.Schema(fields),
             errors=errors,
             description_placeholders={"name": name}
         )
@@ -429,6 +522,8 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         self, discovery_info: zeroconf.ZeroconfServiceInfo
     ) -> FlowResult:
         """Handle zeroconf discovery."""
+        # An announcement from a configured device means it is back online
+        ReconnectScheduler(self.hass).hint_host(discovery_info.host)
         type = discovery_info.type
         name = discovery_info.name
         device_name = name.removesuffix("." + type)
@@ -530,6 +625,9 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
             # Create a new config with updated values
             new_config = dict(self.config_entry.data[CONFIG_DATA])
             new_config[DEVICE_HOST] = user_input[DEVICE_HOST]
+            new_config[SERVER_MODE] = user_input[SERVER_MODE]
+            new_config[CONTROL_TRANSPORT] = user_input[CONTROL_TRANSPORT]
+            new_config[STALL_MULTIPLIER] = int(user_input[STALL_MULTIPLIER])
 
             # Update the config entry with new values
             return self.async_create_entry(
@@ -543,12 +641,24 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
         # Get current values
         current_config = self.config_entry.data.get(CONFIG_DATA, {})
 
-        # Create schema with current values, only IP is editable
+        # Create schema with current values
         schema = vol.Schema({
             vol.Required(
                 DEVICE_HOST,
                 default=current_config.get(DEVICE_HOST, "")
             ): str,
+            vol.Required(
+                SERVER_MODE,
+                default=current_config.get(SERVER_MODE, SERVER_MODE_STANDALONE)
+            ): SERVER_MODE_SELECTOR,
+            vol.Required(
+                CONTROL_TRANSPORT,
+                default=current_config.get(CONTROL_TRANSPORT, CONTROL_TRANSPORT_HTTP)
+            ): CONTROL_TRANSPORT_SELECTOR,
+            vol.Required(
+                STALL_MULTIPLIER,
+                default=current_config.get(STALL_MULTIPLIER, DEFAULT_STALL_MULTIPLIER)
+            ): STALL_MULTIPLIER_SELECTOR,
         })
 
         return self.async_show_form(
@@ -561,5 +671,89 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
         )
 
 
+class WatcherOptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle options for Watcher devices."""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry) -> None:
+        """Initialize options flow."""
+        self.config_entry = config_entry
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Manage the options."""
+        if user_input is not None:
+            new_config = dict(self.config_entry.data[CONFIG_DATA])
+            new_config.update(user_input)
+            for key in (MAX_IMAGES, RETENTION_DAYS, STORAGE_QUOTA, STORAGE_QUOTA_TOTAL,
+                        ALARM_WINDOW, INGEST_WORKERS):
+                new_config[key] = int(new_config[key])
+            return self.async_create_entry(
+                title="",
+                data={
+                    CONFIG_DATA: new_config,
+                    DATA_SOURCE: WATCHER
+                }
+            )
+
+        current_config = self.config_entry.data.get(CONFIG_DATA, {})
+
+        schema = vol.Schema({
+            vol.Required(
+                SERVER_MODE,
+                default=current_config.get(SERVER_MODE, SERVER_MODE_STANDALONE)
+            ): SERVER_MODE_SELECTOR,
+            vol.Required(
+                IMAGE_FORMAT,
+                default=current_config.get(IMAGE_FORMAT, IMAGE_FORMAT_ORIGINAL)
+            ): IMAGE_FORMAT_SELECTOR,
+            vol.Required(
+                IMAGE_QUALITY,
+                default=current_config.get(IMAGE_QUALITY, DEFAULT_IMAGE_QUALITY)
+            ): IMAGE_QUALITY_SELECTOR,
+            vol.Required(
+                DEDUP_PERCEPTUAL,
+                default=current_config.get(DEDUP_PERCEPTUAL, False)
+            ): BooleanSelector(),
+            vol.Required(
+                MAX_IMAGES,
+                default=current_config.get(MAX_IMAGES, DEFAULT_MAX_IMAGES)
+            ): MAX_IMAGES_SELECTOR,
+            vol.Required(
+                RETENTION_DAYS,
+                default=current_config.get(RETENTION_DAYS, DEFAULT_RETENTION_DAYS)
+            ): RETENTION_DAYS_SELECTOR,
+            vol.Required(
+                STORAGE_QUOTA,
+                default=current_config.get(STORAGE_QUOTA, 0)
+            ): STORAGE_QUOTA_SELECTOR,
+            vol.Required(
+                STORAGE_QUOTA_TOTAL,
+                default=current_config.get(STORAGE_QUOTA_TOTAL, 0)
+            ): STORAGE_QUOTA_SELECTOR,
+            vol.Required(
+                ALARM_WINDOW,
+                default=current_config.get(ALARM_WINDOW, 0)
+            ): ALARM_WINDOW_SELECTOR,
+            vol.Required(
+                ALARM_IMAGES,
+                default=current_config.get(ALARM_IMAGES, ALARM_IMAGES_ALL)
+            ): ALARM_IMAGES_SELECTOR,
+            vol.Required(
+                INGEST_WORKERS,
+                default=current_config.get(INGEST_WORKERS, DEFAULT_INGEST_WORKERS)
+            ): INGEST_WORKERS_SELECTOR,
+        })
+
+        return self.async_show_form(
+            step_id="init",
+            data_schema=schema,
+            description_placeholders={
+                "device_name": self.config_entry.title,
+                "message": "You can change how your Watcher device reaches Home Assistant and how alarm images are stored. A storage quota of 0 means unlimited; the smallest total quota of all Watchers applies. Repeated identical alarms within the alarm window are folded into one event, 0 disables this. Parallel image uploads is shared by all Watchers, the last one set up applies."
+            }
+        )
+
+
 class NoApiKey(exceptions.HomeAssistantError):
     """Error to indicate there is an invalid ApiKey."""
@@ -29,6 +29,43 @@ CONFIG_DATA = "config_data"
 MQTT_BROKER = "mqtt_broker"
 MQTT_PORT = "mqtt_port"
 
+SERVER_MODE = "server_mode"
+SERVER_MODE_STANDALONE = "standalone"
+SERVER_MODE_HOMEASSISTANT = "homeassistant"
+SUPPORTED_SERVER_MODE = [SERVER_MODE_STANDALONE, SERVER_MODE_HOMEASSISTANT]
+
+CONTROL_TRANSPORT = "control_transport"
+CONTROL_TRANSPORT_HTTP = "http"
+CONTROL_TRANSPORT_WEBSOCKET = "websocket"
+SUPPORTED_CONTROL_TRANSPORT = [CONTROL_TRANSPORT_HTTP, CONTROL_TRANSPORT_WEBSOCKET]
+
+# Reconnect when no frame arrives for this many frame intervals, 0 disables
+STALL_MULTIPLIER = "stall_multiplier"
+DEFAULT_STALL_MULTIPLIER = 5
+
+IMAGE_FORMAT = "image_format"
+IMAGE_FORMAT_ORIGINAL = "original"
+IMAGE_FORMAT_JPEG = "jpeg"
+IMAGE_FORMAT_WEBP = "webp"
+SUPPORTED_IMAGE_FORMAT = [IMAGE_FORMAT_ORIGINAL, IMAGE_FORMAT_JPEG, IMAGE_FORMAT_WEBP]
+IMAGE_QUALITY = "image_quality"
+DEFAULT_IMAGE_QUALITY = 80
+DEDUP_PERCEPTUAL = "dedup_perceptual"
+MAX_IMAGES = "max_images"
+DEFAULT_MAX_IMAGES = 10000
+RETENTION_DAYS = "retention_days"
+DEFAULT_RETENTION_DAYS = 30
+STORAGE_QUOTA = "storage_quota"
+STORAGE_QUOTA_TOTAL = "storage_quota_total"
+ALARM_WINDOW = "alarm_window"
+ALARM_IMAGES = "alarm_images"
+ALARM_IMAGES_ALL = "all"
+ALARM_IMAGES_FIRST_LAST = "first_last"
+SUPPORTED_ALARM_IMAGES = [ALARM_IMAGES_ALL, ALARM_IMAGES_FIRST_LAST]
+# Notification handlers allowed to run at the same time on the Watcher route
+INGEST_WORKERS = "ingest_workers"
+DEFAULT_INGEST_WORKERS = 2
+
 BROKER = "broker"
 PORT = "port"
 CLIENT_ID = "client_id"
@@ -0,0 +1,66 @@
+"""Connection state of a device shared by its entities."""
+import logging
+from homeassistant.core import HomeAssistant, callback
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AvailabilityCoordinator:
+    """Own the connection state of one device.
+
+    Connection reports are often repeated, e.g. a failed reconnect attempt
+    reports "disconnected" every few seconds. Only real transitions notify
+    the entities, which are called back directly in one pass, and fire the
+    connection state event on the bus.
+    """
+
+    def __init__(self, hass: HomeAssistant, device_id: str, event_type: str):
+        """Initialize the coordinator.
+
+        Args:
+            hass: Home Assistant instance
+            device_id: Device the state belongs to
+            event_type: Bus event fired on every transition
+        """
+        self.hass = hass
+        self.device_id = device_id
+        self.event_type = event_type
+        self.available = False
+        self._listeners = []
+
+    @callback
+    def async_add_listener(self, update_callback):
+        """Call update_callback on every transition.
+
+        Returns:
+            Callable removing the listener
+        """
+        self._listeners.append(update_callback)
+
+        @callback
+        def remove_listener():
+            if update_callback in self._listeners:
+                self._listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def async_set(self, available: bool) -> bool:
+        """Record a connection report.
+
+        Returns:
+            bool: True if the state changed
+        """
+        if available == self.available:
+            return False
+        self.available = available
+        _LOGGER.info("Device %s is now %s", self.device_id,
+                     "available" if available else "unavailable")
+
+        for update_callback in list(self._listeners):
+            try:
+                update_callback()
+            except Exception as e:
+                _LOGGER.error("Error updating availability of %s: %s", self.device_id, e)
+        self.hass.bus.async_fire(self.event_type, {"connected": available})
+        return True
@@ -0,0 +1,121 @@
+"""Latest-wins dispatch of device control commands."""
+import logging
+import time
+from homeassistant.core import HomeAssistant
+from .metrics import CONTROL_LATENCY, CONTROL_SUPERSEDED
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def command_key(command: dict) -> str:
+    """Return the key commands are coalesced by.
+
+    Commands for the same target replace each other, e.g. set_angle is
+    keyed per motor so yaw and pitch do not cancel each other.
+    """
+    key = command.get('command', '')
+    param = command.get('param') or {}
+    if 'motor_id' in param:
+        key = f"{key}:{param['motor_id']}"
+    return key
+
+
+class _Slot:
+    """In-flight state of one command key."""
+
+    __slots__ = ("running", "command", "waiters", "queued_at")
+
+    def __init__(self):
+        self.running = False
+        self.command = None
+        self.waiters = []
+        self.queued_at = 0.0
+
+
+class ControlDispatcher:
+    """Send control commands with at most one request in flight per key.
+
+    A command submitted while another one with the same key is in flight
+    waits in a single slot; a newer command replaces it. Callers whose
+    command was replaced get the result of the command that replaced it.
+    """
+
+    def __init__(self, hass: HomeAssistant, device_id: str, send):
+        """Initialize the dispatcher.
+
+        Args:
+            hass: Home Assistant instance
+            device_id: Device the commands are sent to, used for metrics
+            send: Coroutine function sending one command and returning the result
+        """
+        self.hass = hass
+        self.device_id = device_id
+        self._send = send
+        self._slots = {}
+        self._tasks = set()
+        self._metrics = {}
+
+    async def submit(self, command: dict):
+        """Queue a command and wait for the result of the latest one with its key."""
+        key = command_key(command)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _Slot()
+
+        future = self.hass.loop.create_future()
+        if slot.command is not None:
+            # 丢弃过期命令, 只发送最新值
+            self._key_metrics(key)[1].inc()
+            _LOGGER.debug("Command %s for %s replaced by a newer one", key, self.device_id)
+        slot.command = command
+        slot.waiters.append(future)
+        slot.queued_at = time.monotonic()
+
+        if not slot.running:
+            slot.running = True
+            task = self.hass.async_create_background_task(
+                self._run(key, slot), f"sensecraft control {self.device_id} {key}")
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return await future
+
+    async def _run(self, key: str, slot: _Slot):
+        """Send the queued command of a key until none is left."""
+        latency = self._key_metrics(key)[0]
+        waiters = []  # Callers of the command being sent
+        try:
+            while slot.command is not None:
+                command, waiters, queued_at = slot.command, slot.waiters, slot.queued_at
+                slot.command, slot.waiters = None, []
+                try:
+                    result = await self._send(command)
+                except Exception as e:
+                    _LOGGER.error("Error sending %s to %s: %s", key, self.device_id, e)
+                    result = None
+                latency.observe(time.monotonic() - queued_at)
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(result)
+        finally:
+            slot.running = False
+            # Cancelled while sending: release the callers of the command
+            # in flight as well as those queued behind it
+            for waiter in waiters + slot.waiters:
+                if not waiter.done():
+                    waiter.cancel()
+            slot.command, slot.waiters = None, []
+
+    def _key_metrics(self, key: str) -> tuple:
+        metrics = self._metrics.get(key)
+        if metrics is None:
+            command = key.split(':', 1)[0]
+            metrics = self._metrics[key] = (
+                CONTROL_LATENCY.labels(self.device_id, command),
+                CONTROL_SUPERSEDED.labels(self.device_id, command),
+            )
+        return metrics
+
+    def stop(self):
+        """Cancel all commands in flight."""
+        for task in list(self._tasks):
+            task.cancel()
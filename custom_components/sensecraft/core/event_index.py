@@ -0,0 +1,260 @@
+"""SQLite index of Watcher alarm events.
+
+Each stored image is recorded with its device, time, alarm text, path,
+size and content hash so history can be queried by device and time range
+without listing the image directories. Writes are collected on the event
+loop and committed in one transaction per batch from the executor.
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import HomeAssistant, callback
+
+_LOGGER = logging.getLogger(__name__)
+
+FLUSH_DELAY = 2.0  # Seconds to collect writes before committing them
+FLUSH_SIZE = 200  # Commit immediately once this many writes are pending
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY,
+        eui TEXT NOT NULL,
+        ts REAL NOT NULL,
+        alarm TEXT,
+        path TEXT NOT NULL UNIQUE,
+        size INTEGER NOT NULL DEFAULT 0,
+        hash TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS events_eui_ts ON events (eui, ts)",
+    "CREATE INDEX IF NOT EXISTS events_ts ON events (ts)",
+)
+
+_INSERT = ("INSERT OR REPLACE INTO events (eui, ts, alarm, path, size, hash) "
+           "VALUES (?, ?, ?, ?, ?, ?)")
+_BACKFILL = ("INSERT OR IGNORE INTO events (eui, ts, alarm, path, size, hash) "
+             "VALUES (?, ?, ?, ?, ?, ?)")
+_DELETE = "DELETE FROM events WHERE path = ?"
+# PRAGMA user_version once the images stored before the index are indexed
+_BACKFILLED = 1
+
+
+class EventIndex:
+    """Batched writer and query interface for the event database."""
+
+    def __init__(self, hass: HomeAssistant, db_path: str):
+        """Initialize the index.
+
+        Args:
+            hass: Home Assistant instance
+            db_path: Path of the SQLite database file
+        """
+        self.hass = hass
+        self.db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()
+        self._inserts = []
+        self._deletes = []
+        self._flush_handle = None
+        self._flush_task = None
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, self._async_stop)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database and create the schema. Runs in the executor."""
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @callback
+    def add(self, eui: str, ts: float, alarm: str, path: str, size: int, digest: str | None):
+        """Queue an event for the next batch."""
+        self._inserts.append((eui, ts, alarm, path, size, digest))
+        self._schedule_flush()
+
+    @callback
+    def remove(self, paths: list):
+        """Queue evicted images for deletion in the next batch."""
+        if not paths:
+            return
+        self._deletes.extend((path,) for path in paths)
+        self._schedule_flush()
+
+    @callback
+    def _schedule_flush(self):
+        if len(self._inserts) + len(self._deletes) >= FLUSH_SIZE:
+            self._async_flush_soon()
+        elif self._flush_handle is None:
+            self._flush_handle = self.hass.loop.call_later(FLUSH_DELAY, self._async_flush_soon)
+
+    @callback
+    def _async_flush_soon(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_task is None:
+            self._flush_task = self.hass.async_create_background_task(
+                self._async_background_flush(), "sensecraft event index flush")
+
+    async def _async_background_flush(self):
+        try:
+            await self.async_flush()
+        finally:
+            self._flush_task = None
+        # Writes queued while committing
+        if self._inserts or self._deletes:
+            self._schedule_flush()
+
+    async def async_flush(self):
+        """Commit all pending writes in one transaction."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        inserts, self._inserts = self._inserts, []
+        deletes, self._deletes = self._deletes, []
+        if not inserts and not deletes:
+            return
+        try:
+            await self.hass.async_add_executor_job(self._write, inserts, deletes)
+        except Exception as e:
+            _LOGGER.error("Error writing %d events to %s: %s",
+                          len(inserts) + len(deletes), self.db_path, e)
+
+    def _write(self, inserts: list, deletes: list):
+        """Apply a batch of writes. Runs in the executor."""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                if inserts:
+                    conn.executemany(_INSERT, inserts)
+                if deletes:
+                    conn.executemany(_DELETE, deletes)
+
+    def backfill(self, rows: list) -> int:
+        """Index images stored before the database existed. Runs in the executor.
+
+        Args:
+            rows: (eui, ts, alarm, path, size, hash) of every stored image
+
+        Returns:
+            int: Number of events added
+        """
+        with self._lock:
+            conn = self._connect()
+            # Live events may be committed first, so the table being empty
+            # does not tell whether the backfill ran
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= _BACKFILLED:
+                return 0
+            with conn:
+                before = conn.total_changes
+                conn.executemany(_BACKFILL, rows)
+                added = conn.total_changes - before
+                conn.execute(f"PRAGMA user_version = {_BACKFILLED}")
+            return added
+
+    def _query(self, eui, start, end, limit, cursor) -> list:
+        """Run a page query. Runs in the executor."""
+        sql = "SELECT id, eui, ts, alarm, path, size, hash FROM events WHERE 1 = 1"
+        args = []
+        if eui is not None:
+            sql += " AND eui = ?"
+            args.append(eui)
+        if start is not None:
+            sql += " AND ts >= ?"
+            args.append(start)
+        if end is not None:
+            sql += " AND ts < ?"
+            args.append(end)
+        if cursor is not None:
+            sql += " AND (ts < ? OR (ts = ? AND id < ?))"
+            args.extend((cursor[0], cursor[0], cursor[1]))
+        sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+        args.append(limit)
+        return self._fetch(sql, args)
+
+    async def _async_sync(self):
+        """Make events that are still batched visible to queries."""
+        if self._flush_task is not None:
+            await asyncio.shield(self._flush_task)
+        if self._inserts or self._deletes:
+            await self.async_flush()
+
+    def _fetch(self, sql: str, args=()) -> list:
+        """Run a read query. Runs in the executor."""
+        with self._lock:
+            return self._connect().execute(sql, args).fetchall()
+
+    async def async_devices(self) -> list:
+        """Return the devices that have events."""
+        await self._async_sync()
+        rows = await self.hass.async_add_executor_job(
+            self._fetch, "SELECT DISTINCT eui FROM events ORDER BY eui")
+        return [row[0] for row in rows]
+
+    async def async_days(self, eui: str) -> list:
+        """Return (day, event count) of a device, newest day first."""
+        await self._async_sync()
+        return await self.hass.async_add_executor_job(
+            self._fetch,
+            "SELECT date(ts, 'unixepoch', 'localtime') AS day, COUNT(*) FROM events "
+            "WHERE eui = ? GROUP BY day ORDER BY day DESC", (eui,))
+
+    async def async_get(self, event_id: int):
+        """Return the row of an event, or None."""
+        await self._async_sync()
+        rows = await self.hass.async_add_executor_job(
+            self._fetch,
+            "SELECT id, eui, ts, alarm, path, size, hash FROM events WHERE id = ?",
+            (event_id,))
+        return rows[0] if rows else None
+
+    async def async_query(self, eui: str | None = None, start: float | None = None,
+                          end: float | None = None, limit: int = DEFAULT_PAGE_SIZE,
+                          cursor: str | None = None) -> tuple:
+        """Return a page of events, newest first.
+
+        Args:
+            eui: Device key, None for all devices
+            start: Oldest event timestamp, inclusive
+            end: Newest event timestamp, exclusive
+            limit: Page size
+            cursor: Cursor returned with the previous page
+
+        Returns:
+            tuple: List of event rows and the cursor of the next page, or None
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        position = None
+        if cursor:
+            try:
+                ts, row_id = cursor.split(":", 1)
+                position = (float(ts), int(row_id))
+            except ValueError as e:
+                raise ValueError(f"Invalid cursor: {cursor}") from e
+        await self._async_sync()
+        rows = await self.hass.async_add_executor_job(
+            self._query, eui, start, end, limit + 1, position)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = f"{rows[-1][2]!r}:{rows[-1][0]}"
+        return rows, next_cursor
+
+    def _close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    async def _async_stop(self, event):
+        """Commit pending writes and close the database."""
+        await self.async_flush()
+        await self.hass.async_add_executor_job(self._close)
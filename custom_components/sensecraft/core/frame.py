@@ -0,0 +1,211 @@
+"""Decoding of ReCamera camera frames.
+
+Two frame formats are accepted on the camera WebSocket:
+
+* Binary envelope: ``FRAME_MAGIC``, a 4 byte big-endian header length, a
+  JSON metadata header of that length, then the raw JPEG bytes.
+* Legacy: a JSON document ``{"code": 0, "data": {"image": <base64>, ...}}``.
+
+The envelope avoids base64 and parsing the image as JSON, the image is a
+memoryview slice of the received message.
+
+Frames are kept as received in a ``FrameStore``; they are only decoded,
+and the detection overlay only rendered, when a viewer asks for them.
+"""
+import asyncio
+import json
+import logging
+from base64 import b64decode
+from homeassistant.core import HomeAssistant, callback
+from .overlay import OverlayRenderer
+
+_LOGGER = logging.getLogger(__name__)
+
+FRAME_MAGIC = b"SCF1"
+_HEADER_START = len(FRAME_MAGIC) + 4
+
+
+def parse_frame(message: bytes):
+    """Split a frame message into metadata and image.
+
+    Args:
+        message: Binary WebSocket message
+
+    Returns:
+        tuple: Metadata dict and image bytes or memoryview, or None if the
+        message carries no image
+
+    Raises:
+        ValueError: If the message is malformed
+    """
+    if message[:len(FRAME_MAGIC)] == FRAME_MAGIC:
+        return _parse_envelope(message)
+
+    parsed = json.loads(message)
+    if parsed.get('code') != 0 or not isinstance(parsed.get('data'), dict):
+        return None
+    meta = parsed['data']
+    image = meta.pop('image', None)
+    if not image:
+        return None
+    return meta, b64decode(image)
+
+
+def _parse_envelope(message: bytes):
+    view = memoryview(message)
+    if len(view) < _HEADER_START:
+        raise ValueError("Truncated frame header")
+    length = int.from_bytes(view[len(FRAME_MAGIC):_HEADER_START], 'big')
+    image_start = _HEADER_START + length
+    if image_start > len(view):
+        raise ValueError("Frame header length exceeds message size")
+    meta = json.loads(view[_HEADER_START:image_start].tobytes()) if length else {}
+    image = view[image_start:]
+    if not len(image):
+        return None
+    return meta, image
+
+
+class FrameStore:
+    """Newest frame of a camera: received message, decoded image and overlay.
+
+    Storing a frame costs nothing, the message is decoded when a viewer
+    first asks for it. The annotated image is rendered on request, once per
+    frame, and shared by every still image and stream consumer asking for
+    that frame.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        """Initialize the store."""
+        self.hass = hass
+        self.seq = 0
+        self.meta = {}
+        self._message = None  # Newest message, decoded on first request
+        self._decoded = 0  # seq of the newest decoded message
+        self._decode = None  # (seq, task) of the message being decoded
+        self._image_seq = 0  # seq of the frame the image belongs to
+        self._image = None
+        self._raw = None  # Raw image as bytes, converted on first request
+        self._overlay = None  # (seq, bytes) of the last rendered overlay
+        self._render = None  # (seq, task) of the overlay being rendered
+        self._listeners = []
+
+    @property
+    def has_frame(self) -> bool:
+        """Return True once a frame was stored."""
+        return self._message is not None
+
+    @callback
+    def async_add_listener(self, update_callback):
+        """Call update_callback for every new frame.
+
+        Returns:
+            Callable removing the listener
+        """
+        self._listeners.append(update_callback)
+
+        @callback
+        def remove_listener():
+            if update_callback in self._listeners:
+                self._listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def update(self, message: bytes):
+        """Store a new frame.
+
+        Args:
+            message: Frame message as received from the WebSocket
+        """
+        self.seq += 1
+        self._message = message
+        for update_callback in list(self._listeners):
+            try:
+                update_callback()
+            except Exception as e:
+                _LOGGER.error("Error publishing frame: %s", e)
+
+    async def _async_decode(self):
+        """Decode the newest message unless done already.
+
+        A message that fails to decode or carries no image keeps the
+        previous frame.
+        """
+        seq = self.seq
+        if self._decoded == seq:
+            return
+        message = self._message
+        if message[:len(FRAME_MAGIC)] == FRAME_MAGIC:
+            # Only the header is parsed, the image is a slice of the message
+            self._apply(seq, self._parse(message))
+            return
+        if self._decode is None or self._decode[0] != seq:
+            task = self.hass.async_create_background_task(
+                self._async_decode_legacy(seq, message), f"sensecraft frame {seq}")
+            self._decode = (seq, task)
+        # Shielded: a viewer going away must not cancel a shared decode
+        await asyncio.shield(self._decode[1])
+
+    async def _async_decode_legacy(self, seq: int, message: bytes):
+        # 旧格式需要 base64 解码, 在线程池中进行
+        parsed = await self.hass.async_add_executor_job(self._parse, message)
+        self._apply(seq, parsed)
+        if self._decode is not None and self._decode[0] == seq:
+            self._decode = None
+
+    @staticmethod
+    def _parse(message: bytes):
+        try:
+            return parse_frame(message)
+        except Exception as e:
+            _LOGGER.error("Error parsing frame: %s", e)
+            return None
+
+    def _apply(self, seq: int, parsed):
+        if seq <= self._decoded:
+            return
+        self._decoded = seq
+        if parsed is not None:
+            self.meta, self._image = parsed
+            self._image_seq = seq
+            self._raw = None
+
+    async def async_raw(self) -> bytes | None:
+        """Return the raw image of the newest frame."""
+        if self._message is not None:
+            await self._async_decode()
+        if self._raw is None and self._image is not None:
+            image = self._image
+            self._raw = image.tobytes() if isinstance(image, memoryview) else image
+        return self._raw
+
+    async def async_annotated(self) -> bytes | None:
+        """Return the newest frame with its detections drawn on it."""
+        if self._message is not None:
+            await self._async_decode()
+        seq = self._image_seq
+        if not self.meta.get('boxes'):
+            return await self.async_raw()
+        if self._overlay is not None and self._overlay[0] == seq:
+            return self._overlay[1]
+
+        if self._render is None or self._render[0] != seq:
+            task = self.hass.async_create_background_task(
+                self._async_render(seq, self._image, self.meta),
+                f"sensecraft overlay {seq}")
+            self._render = (seq, task)
+        # Shielded: a viewer going away must not cancel a shared render
+        return await asyncio.shield(self._render[1])
+
+    async def _async_render(self, seq: int, image, meta: dict) -> bytes | None:
+        try:
+            data = await OverlayRenderer(self.hass).async_render(image, meta)
+        except Exception as e:
+            _LOGGER.error("Error rendering overlay: %s", e)
+            data = image.tobytes() if isinstance(image, memoryview) else image
+        if self._overlay is None or self._overlay[0] < seq:
+            self._overlay = (seq, data)
+        if self._render is not None and self._render[0] == seq:
+            self._render = None
+        return data
@@ -1,6 +1,14 @@
+import asyncio
 import logging
-from aiohttp import web
+import time
+from ipaddress import ip_address
+from aiohttp import hdrs, web
+from homeassistant.components.http import HomeAssistantView
 from homeassistant.core import HomeAssistant
+from homeassistant.util.network import is_local
+from .ingest import IngestQueue
+from .metrics import CONTENT_TYPE, HTTP_HANDLERS, REGISTRY, RouteMetrics
+from ..const import SERVER_MODE_HOMEASSISTANT, SERVER_MODE_STANDALONE
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -11,6 +19,16 @@ class HTTPClient:
 
     RECAMERA_STATE_PATH = '/recamera/state'
     WATCHER_STATE_PATH = '/v1/notification/event'
+    METRICS_PATH = '/metrics'
+
+    # Batched Watcher notifications carry several images per request
+    MAX_REQUEST_SIZE = 16 * 1024 * 1024
+
+    # Default worker pool size and queue length per route, see configure_route()
+    ROUTE_LIMITS = {
+        RECAMERA_STATE_PATH: (1, 16),
+        WATCHER_STATE_PATH: (2, 32),
+    }
 
     def __new__(cls, hass: HomeAssistant):
         if cls._instance is None:
@@ -26,21 +44,82 @@ class HTTPClient:
             self.RECAMERA_STATE_PATH: None,
             self.WATCHER_STATE_PATH: None
         }
+        self.queues = {
+            path: IngestQueue(hass, path, workers, max_queue)
+            for path, (workers, max_queue) in self.ROUTE_LIMITS.items()
+        }
+        self._metrics = {}
+        HTTP_HANDLERS.set_function(
+            lambda: sum(1 for handler in self.handlers.values() if handler is not None))
         self.app = None
         self.runner = None
         self.site = None
+        self._users = {
+            SERVER_MODE_STANDALONE: 0,
+            SERVER_MODE_HOMEASSISTANT: 0,
+        }
+        self._views_registered = False
+        self._lock = asyncio.Lock()
         self._initialized = True
-        self.hass.async_create_task(self._init_server())
         _LOGGER.info("HTTPClient initialized")
 
+    def acquire(self, mode: str = SERVER_MODE_STANDALONE):
+        """Register a device that receives its state through the given server mode.
+
+        Args:
+            mode: SERVER_MODE_STANDALONE to listen on the fixed port,
+                SERVER_MODE_HOMEASSISTANT to serve from Home Assistant's HTTP server
+        """
+        if mode not in self._users:
+            mode = SERVER_MODE_STANDALONE
+        self._users[mode] += 1
+        self.hass.async_create_task(self._async_update())
+
+    def release(self, mode: str = SERVER_MODE_STANDALONE):
+        """Unregister a device added with acquire()."""
+        if mode not in self._users:
+            mode = SERVER_MODE_STANDALONE
+        if self._users[mode] > 0:
+            self._users[mode] -= 1
+        self.hass.async_create_task(self._async_update())
+
+    async def _async_update(self):
+        """Start or stop servers and workers to match the registered devices."""
+        async with self._lock:
+            if self._users[SERVER_MODE_HOMEASSISTANT] and not self._views_registered:
+                self._register_views()
+
+            if self._users[SERVER_MODE_STANDALONE] and self.runner is None:
+                await self._init_server()
+            elif not self._users[SERVER_MODE_STANDALONE] and self.runner is not None:
+                await self._stop_server()
+
+            if any(self._users.values()):
+                for queue in self.queues.values():
+                    queue.start()
+            else:
+                for queue in self.queues.values():
+                    queue.stop()
+
+    def _register_views(self):
+        """Serve the device routes from Home Assistant's HTTP server."""
+        self.hass.http.register_view(
+            IngestView(self, self.RECAMERA_STATE_PATH, "api:sensecraft:recamera_state"))
+        self.hass.http.register_view(
+            IngestView(self, self.WATCHER_STATE_PATH, "api:sensecraft:watcher_event"))
+        self.hass.http.register_view(MetricsView(self))
+        self._views_registered = True
+        _LOGGER.info("Device routes registered on the Home Assistant HTTP server")
+
     async def _init_server(self):
         """Initialize and start the web server."""
         try:
-            self.app = web.Application()
+            self.app = web.Application(client_max_size=self.MAX_REQUEST_SIZE)
             
             # 注册所有固定路由
             self.app.router.add_post(self.RECAMERA_STATE_PATH, self.handle_request)
             self.app.router.add_post(self.WATCHER_STATE_PATH, self.handle_request)
+            self.app.router.add_get(self.METRICS_PATH, self.handle_standalone_metrics)
             
             self.runner = web.AppRunner(self.app)
             await self.runner.setup()
@@ -49,43 +128,176 @@ class HTTPClient:
             _LOGGER.info("HTTP server started on port %d with predefined routes", self._port)
         except Exception as e:
             _LOGGER.error("Failed to start HTTP server: %s", e)
+            await self._stop_server()
+
+    async def _stop_server(self):
+        """Stop the standalone web server."""
+        if self.runner is not None:
+            try:
+                await self.runner.cleanup()
+            except Exception as e:
+                _LOGGER.error("Failed to stop HTTP server: %s", e)
+        self.app = None
+        self.runner = None
+        self.site = None
+        _LOGGER.info("HTTP server on port %d stopped", self._port)
+
+    def configure_route(self, path: str, workers: int):
+        """Change the worker pool size of a route.
+
+        Args:
+            path: Route path
+            workers: Number of handlers allowed to run concurrently
+        """
+        queue = self.queues.get(path)
+        if queue is not None and queue.workers != workers:
+            queue.configure(workers)
+            _LOGGER.debug("Ingest workers for %s set to %d", path, queue.workers)
+
+    async def handle_metrics(self, request):
+        """Serve metrics in the Prometheus text exposition format."""
+        return web.Response(body=REGISTRY.render().encode(),
+                            headers={'Content-Type': CONTENT_TYPE})
+
+    async def handle_standalone_metrics(self, request):
+        """Serve metrics on the standalone server.
+
+        The server listens on all interfaces, so like MetricsView this
+        requires a Home Assistant access token as a Bearer token.
+        """
+        scheme, _, token = request.headers.get(hdrs.AUTHORIZATION, "").partition(" ")
+        if (scheme.lower() != "bearer"
+                or self.hass.auth.async_validate_access_token(token) is None):
+            return web.Response(status=401, headers={hdrs.WWW_AUTHENTICATE: "Bearer"})
+        return await self.handle_metrics(request)
+
+    def _route_metrics(self, path: str) -> RouteMetrics:
+        """Return the metric children for a route."""
+        metrics = self._metrics.get(path)
+        if metrics is None:
+            metrics = self._metrics[path] = RouteMetrics(path)
+        return metrics
 
     async def handle_request(self, request):
         """Handle incoming HTTP POST request."""
+        started = time.monotonic()
+        metrics = self._route_metrics(request.path)
+        if request.content_length is not None:
+            metrics.request_bytes.observe(request.content_length)
+
+        payload, status, headers = await self._dispatch(request)
+
+        metrics.response(payload['code']).inc()
+        metrics.duration.observe(time.monotonic() - started)
+        return web.json_response(payload, status=status, headers=headers)
+
+    async def _dispatch(self, request):
+        """Run the handler registered for the request path.
+
+        Returns:
+            tuple: Response payload, HTTP status and extra headers
+        """
         try:
             path = request.path
             handler = self.handlers.get(path)
             
             if handler is not None:
+                queue = self.queues.get(path)
+                if queue is not None and not queue.running:
+                    return self._busy_response(503, "Service Unavailable", 5)
                 try:
                     # 调用处理函数并获取结果
-                    result = await handler(request)
+                    if queue is None:
+                        result = await handler(request)
+                    else:
+                        try:
+                            future = queue.submit(handler, request)
+                        except asyncio.QueueFull:
+                            queue.reject()
+                            return self._busy_response(
+                                429, "Too Many Requests", queue.retry_after)
+                        result = await future
                     # 如果处理函数返回了错误码和消息，使用它们
                     if isinstance(result, dict) and 'code' in result and 'msg' in result:
-                        return web.json_response(result)
+                        return result, 200, None
                     # 否则返回成功响应
-                    return web.json_response({
+                    return {
                         'code': 200,
                         'msg': "Success",
                         'data': result if result is not None else {}
-                    })
+                    }, 200, None
                 except Exception as e:
                     _LOGGER.error("Error in handler for path %s: %s", path, e)
-                    return web.json_response({
+                    return {
                         'code': 11999,
                         'msg': str(e),
                         'data': {}
-                    })
+                    }, 200, None
             _LOGGER.warning("No handler registered for path: %s", path)
-            return web.json_response({
+            return {
                 'code': 404,
                 'msg': "Handler not registered",
                 'data': {}
-            })
+            }, 200, None
         except Exception as e:
             _LOGGER.error("Error handling request: %s", e)
-            return web.json_response({
+            return {
                 'code': 11999,
                 'msg': "Illegal Input",
                 'data': {}
-            }) 
\ No newline at end of file
+            }, 200, None
+
+    def _busy_response(self, status: int, msg: str, retry_after: int):
+        """Build a back-pressure response."""
+        return {
+            'code': status,
+            'msg': msg,
+            'data': {}
+        }, status, {'Retry-After': str(retry_after)}
+
+
+class IngestView(HomeAssistantView):
+    """Device route served from Home Assistant's HTTP server.
+
+    Devices cannot send an access token, so only callers on the local
+    network are accepted.
+    """
+
+    requires_auth = False
+
+    def __init__(self, client: HTTPClient, url: str, name: str):
+        """Initialize the view."""
+        self.url = url
+        self.name = name
+        self._client = client
+
+    async def post(self, request):
+        """Handle a device POST."""
+        try:
+            local = is_local(ip_address(request.remote))
+        except ValueError:
+            local = False
+        if not local:
+            _LOGGER.warning("Rejected %s request from non-local address %s",
+                            self.url, request.remote)
+            return web.json_response({
+                'code': 403,
+                'msg': "Forbidden",
+                'data': {}
+            }, status=403)
+        return await self._client.handle_request(request)
+
+
+class MetricsView(HomeAssistantView):
+    """Ingest metrics served from Home Assistant's HTTP server."""
+
+    url = "/api/sensecraft/metrics"
+    name = "api:sensecraft:metrics"
+
+    def __init__(self, client: HTTPClient):
+        """Initialize the view."""
+        self._client = client
+
+    async def get(self, request):
+        """Return the metrics."""
+        return await self._client.handle_metrics(request)
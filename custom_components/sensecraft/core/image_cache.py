@@ -0,0 +1,102 @@
+"""In-memory cache of image bytes served to Home Assistant."""
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from homeassistant.core import HomeAssistant
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CACHE_BYTES = 16 * 1024 * 1024
+
+
+def _read(path: str):
+    """Return (mtime, bytes) of a file, or None if it is gone. Runs in the executor."""
+    try:
+        with open(path, 'rb') as file:
+            mtime = os.fstat(file.fileno()).st_mtime
+            return mtime, file.read()
+    except FileNotFoundError:
+        return None
+
+
+class ImageCache:
+    """Byte-capped LRU of image files keyed by path and mtime.
+
+    Stored images are written once under a unique name and never modified,
+    so the mtime seen when a path was cached stays valid until the image is
+    evicted. Concurrent requests for the same uncached path share one read.
+    """
+
+    def __init__(self, hass: HomeAssistant, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.hass = hass
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (path, mtime) -> bytes
+        self._mtimes = {}  # path -> mtime of the cached entry
+        self._reads = {}  # path -> future of a read in progress
+
+    def put(self, path: str, mtime: float, data: bytes):
+        """Cache the bytes of a file."""
+        if len(data) > self.max_bytes:
+            return
+        self.discard(path)
+        key = (path, mtime)
+        self._entries[key] = data
+        self._mtimes[path] = mtime
+        self.bytes += len(data)
+        while self.bytes > self.max_bytes:
+            (old_path, _), old_data = self._entries.popitem(last=False)
+            del self._mtimes[old_path]
+            self.bytes -= len(old_data)
+
+    def get(self, path: str, mtime: float | None = None) -> bytes | None:
+        """Return cached bytes, optionally only if cached at the given mtime."""
+        cached = self._mtimes.get(path)
+        if cached is None or (mtime is not None and cached != mtime):
+            return None
+        key = (path, cached)
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def discard(self, path: str):
+        """Drop a file from the cache."""
+        mtime = self._mtimes.pop(path, None)
+        if mtime is not None:
+            self.bytes -= len(self._entries.pop((path, mtime)))
+
+    async def async_read(self, path: str) -> bytes | None:
+        """Return the bytes of a file, reading it in the executor on a miss.
+
+        Returns:
+            bytes: File content, or None if the file does not exist
+        """
+        data = self.get(path)
+        if data is not None:
+            self.hits += 1
+            return data
+        self.misses += 1
+
+        if (future := self._reads.get(path)) is not None:
+            return await asyncio.shield(future)
+        future = self._reads[path] = self.hass.loop.create_future()
+        try:
+            result = await self.hass.async_add_executor_job(_read, path)
+            data = None
+            if result is not None:
+                self.put(path, *result)
+                data = result[1]
+            future.set_result(data)
+            return data
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark it retrieved, the error is raised to this caller below
+            future.exception()
+            raise
+        finally:
+            del self._reads[path]
@@ -0,0 +1,246 @@
+"""Image processing for Watcher snapshots.
+
+Decoding, format detection, re-encoding and thumbnail generation run in a
+dedicated executor so large alarm images neither block the event loop nor
+compete with Home Assistant's shared executor.
+
+Image data is stored once per content hash. An image the device has sent
+before is only hard linked into the event directory, without decoding or
+writing it again.
+"""
+import hashlib
+import io
+import logging
+import os
+import shutil
+from base64 import b64decode
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from homeassistant.core import HomeAssistant
+from .image_store import blob_path, thumbnail_path
+from ..const import (
+    DEFAULT_IMAGE_QUALITY,
+    IMAGE_FORMAT_JPEG,
+    IMAGE_FORMAT_ORIGINAL,
+    IMAGE_FORMAT_WEBP,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (320, 240)
+THUMBNAIL_QUALITY = 75
+
+# Maximum Hamming distance between difference hashes of near-duplicates
+DHASH_DISTANCE = 5
+
+# Extension for each format reported by PIL
+FORMAT_EXTENSIONS = {
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "WEBP": ".webp",
+    "GIF": ".gif",
+    "BMP": ".bmp",
+}
+
+_executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Return the executor used for image processing."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sensecraft_image")
+    return _executor
+
+
+class ProcessedImage:
+    """Result of storing an image."""
+
+    __slots__ = ("path", "thumbnail", "size", "format", "digest", "blob", "dhash", "duplicate",
+                 "thumbnail_data", "thumbnail_mtime")
+
+    def __init__(self, path: str, thumbnail: str | None, size: int, format: str,
+                 digest: str | None = None, blob: str | None = None,
+                 dhash: int | None = None, duplicate: bool = False):
+        self.path = path
+        self.thumbnail = thumbnail
+        # Bytes written, 0 for an image that reuses a stored blob
+        self.size = size
+        self.format = format
+        self.digest = digest
+        self.blob = blob
+        self.dhash = dhash
+        # True if the image reuses data that was already stored
+        self.duplicate = duplicate
+        # Thumbnail content to prime the image cache without reading it back
+        self.thumbnail_data = None
+        self.thumbnail_mtime = None
+
+
+def _encode(image: Image.Image, format: str, quality: int) -> bytes:
+    """Encode an image in JPEG or WebP."""
+    buffer = io.BytesIO()
+    if format == IMAGE_FORMAT_WEBP:
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    else:
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def _write(path: str, data: bytes):
+    """Write a file atomically."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+def _link(source: str, target: str):
+    """Hard link a stored file into place, copying if links are not supported.
+
+    Raises:
+        FileNotFoundError: If the source was removed in the meantime
+    """
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        os.remove(target)
+        os.link(source, target)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _find_blob(base: str) -> str | None:
+    """Return the stored blob for a blob base path, if any."""
+    for extension in FORMAT_EXTENSIONS.values():
+        if os.path.exists(base + extension):
+            return base + extension
+    return None
+
+
+def _dhash(image: Image.Image) -> int:
+    """Return the 64-bit difference hash of an image."""
+    pixels = list(image.convert("L").resize((9, 8), Image.BILINEAR).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            value = (value << 1) | (left > pixels[row * 9 + col + 1])
+    return value
+
+
+def _link_event(blob: str, base_path: str, size: int, format: str, digest: str,
+                dhash: int | None = None, duplicate: bool = False,
+                thumbnail_data: bytes | None = None) -> ProcessedImage:
+    """Link a blob and its thumbnail into the event directory."""
+    path = base_path + os.path.splitext(blob)[1]
+    _link(blob, path)
+    result = ProcessedImage(path, None, size, format, digest, blob, dhash, duplicate)
+    thumbnail = thumbnail_path(path)
+    try:
+        _link(thumbnail_path(blob), thumbnail)
+        with open(thumbnail, "rb") as file:
+            result.thumbnail_mtime = os.fstat(file.fileno()).st_mtime
+            result.thumbnail_data = thumbnail_data or file.read()
+        result.thumbnail = thumbnail
+    except OSError:
+        pass
+    return result
+
+
+def process_image(image_base64, base_path: str, image_format: str, quality: int,
+                  blob_dir: str, perceptual: bool = False, recent=()) -> ProcessedImage:
+    """Decode, store and thumbnail an image. Runs in the image executor.
+
+    Args:
+        image_base64: Base64 encoded image received from the device
+        base_path: Event path without extension
+        image_format: One of const.SUPPORTED_IMAGE_FORMAT
+        quality: Encoder quality for JPEG/WebP
+        blob_dir: Directory of content-addressed image data
+        perceptual: Compute the dHash of the image and reuse a near-duplicate
+            from recent, otherwise only identical images are reused
+        recent: (dhash, digest, blob) of recent images to match near-duplicates
+            against
+
+    Returns:
+        ProcessedImage: Stored image information
+    """
+    data = b64decode(image_base64)
+    digest = hashlib.sha256(data).hexdigest()
+    base = blob_path(blob_dir, digest)
+    os.makedirs(os.path.dirname(base_path), exist_ok=True)
+
+    # 相同内容只存一份
+    if blob := _find_blob(base):
+        try:
+            return _link_event(blob, base_path, 0, "", digest, duplicate=True)
+        except FileNotFoundError:
+            # Evicted while linking, store it again
+            pass
+
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Exception as e:
+        # Keep what the device sent even if PIL cannot read it
+        _LOGGER.warning("Unrecognized image data for %s: %s", base_path, e)
+        blob = base + ".png"
+        _write(blob, data)
+        path = base_path + ".png"
+        _link(blob, path)
+        return ProcessedImage(path, None, len(data), "", digest, blob)
+
+    dhash = None
+    if perceptual:
+        dhash = _dhash(image)
+        for other_hash, other_digest, other_blob in recent:
+            if (dhash ^ other_hash).bit_count() > DHASH_DISTANCE:
+                continue
+            try:
+                return _link_event(other_blob, base_path, 0, "",
+                                   other_digest, other_hash, True)
+            except FileNotFoundError:
+                continue
+
+    detected = image.format or ""
+    if image_format in (IMAGE_FORMAT_JPEG, IMAGE_FORMAT_WEBP):
+        encoded = _encode(image, image_format, quality)
+        # Keep the original if re-encoding does not make it smaller
+        if len(encoded) < len(data):
+            data = encoded
+            detected = "WEBP" if image_format == IMAGE_FORMAT_WEBP else "JPEG"
+
+    blob = base + FORMAT_EXTENSIONS.get(detected, ".png")
+    size = len(data)
+    thumbnail = None
+    try:
+        image.thumbnail(THUMBNAIL_SIZE)
+        thumbnail = _encode(image, IMAGE_FORMAT_JPEG, THUMBNAIL_QUALITY)
+        _write(thumbnail_path(blob), thumbnail)
+        size += len(thumbnail)
+    except Exception as e:
+        _LOGGER.error("Failed to create thumbnail for %s: %s", base_path, e)
+    _write(blob, data)
+
+    return _link_event(blob, base_path, size, detected, digest, dhash,
+                       thumbnail_data=thumbnail)
+
+
+async def async_process_image(hass: HomeAssistant, image_base64, base_path: str,
+                              blob_dir: str,
+                              image_format: str = IMAGE_FORMAT_ORIGINAL,
+                              quality: int = DEFAULT_IMAGE_QUALITY,
+                              perceptual: bool = False,
+                              recent=()) -> ProcessedImage:
+    """Store an image and its thumbnail off the event loop."""
+    return await hass.loop.run_in_executor(
+        _get_executor(), process_image, image_base64, base_path, image_format, quality,
+        blob_dir, perceptual, tuple(recent))
@@ -0,0 +1,580 @@
+"""Image retention index for Watcher snapshots.
+
+Images are stored once by content hash and linked into a directory per
+device and per day:
+
+    www/images/blobs/<hh>/<sha256>.<ext>
+    www/images/<eui>/YYYY/MM/DD/watcher_<timestamp>.<ext>
+    www/images/<eui>/YYYY/MM/DD/watcher_<timestamp>_thumb.jpg
+
+Event files are hard links to the blob, so they are served as
+/local/images/<eui>/YYYY/MM/DD/<name>, and a day that falls out of the
+retention period is removed as one directory. A blob is deleted once no
+event references it.
+"""
+import logging
+import os
+import re
+import shutil
+import time
+from collections import deque
+from datetime import datetime
+from homeassistant.core import HomeAssistant, callback
+from .event_index import EventIndex, DEFAULT_PAGE_SIZE
+from .image_cache import ImageCache
+from ..const import DEFAULT_MAX_IMAGES, DEFAULT_RETENTION_DAYS
+
+_LOGGER = logging.getLogger(__name__)
+
+IMAGE_PREFIX = 'watcher_'
+IMAGE_SUFFIXES = ('.png', '.jpg', '.webp', '.gif', '.bmp')
+THUMBNAIL_SUFFIX = '_thumb.jpg'
+LEGACY_DIR = 'legacy'
+BLOB_DIR = 'blobs'
+EVENT_DB = 'sensecraft_events.db'
+
+
+class StoredImage:
+    """A stored image in the retention index."""
+
+    __slots__ = ("mtime", "path", "eui", "alias", "size", "digest")
+
+    def __init__(self, mtime: float, path: str, eui: str | None, alias: str | None = None,
+                 size: int = 0, digest: str | None = None):
+        self.mtime = mtime
+        self.path = path
+        self.eui = eui
+        # Pre-sharding location kept as a hard link so old URLs still resolve
+        self.alias = alias
+        self.size = size
+        # Content hash of the blob this event references
+        self.digest = digest
+
+    @property
+    def day_dir(self) -> str:
+        """Return the day directory holding the image."""
+        return os.path.dirname(self.path)
+
+
+class StoredBlob:
+    """Content-addressed image data shared by one or more events."""
+
+    __slots__ = ("path", "size", "refs", "eui")
+
+    def __init__(self, path: str, size: int, eui: str | None = None):
+        self.path = path
+        # Bytes of the image and its thumbnail
+        self.size = size
+        self.refs = 0
+        # Device the stored bytes are accounted to
+        self.eui = eui
+
+
+def blob_path(blob_dir: str, digest: str) -> str:
+    """Return the blob path for a content hash, without extension."""
+    return os.path.join(blob_dir, digest[:2], digest)
+
+
+def _shard_dir(image_dir: str, eui: str, mtime: float) -> str:
+    """Return the day directory for an image of a device."""
+    day = datetime.fromtimestamp(mtime)
+    return os.path.join(image_dir, eui, f"{day.year:04d}", f"{day.month:02d}", f"{day.day:02d}")
+
+
+def _device_dir(eui) -> str:
+    """Return the directory name used for a device."""
+    return re.sub(r'[^0-9A-Za-z_-]', '_', str(eui))
+
+
+def thumbnail_path(path: str) -> str:
+    """Return the thumbnail path for an image path."""
+    return os.path.splitext(path)[0] + THUMBNAIL_SUFFIX
+
+
+def _is_image(name: str) -> bool:
+    return (name.startswith(IMAGE_PREFIX) and name.endswith(IMAGE_SUFFIXES)
+            and not name.endswith(THUMBNAIL_SUFFIX))
+
+
+def _image_time(name: str, default: float) -> float:
+    """Return the event time encoded in an image name.
+
+    Event files are hard links to shared blobs, so their mtime is the time
+    the data was first stored rather than the time of the event.
+    """
+    stamp = name[len(IMAGE_PREFIX):].split('.', 1)[0]
+    try:
+        return datetime.strptime(stamp, '%Y%m%d_%H%M%S_%f').timestamp()
+    except ValueError:
+        return default
+
+
+def _migrate_legacy_images(image_dir: str) -> dict:
+    """Link images from the flat layout into the legacy shard.
+
+    The flat file is kept as a hard link so existing /local/images/<name>
+    URLs keep working until the image expires. When hard links are not
+    supported the file is moved instead.
+
+    Returns:
+        dict: Shard path to flat path for every image still linked
+    """
+    aliases = {}
+    try:
+        with os.scandir(image_dir) as it:
+            legacy = [entry for entry in it if entry.is_file() and _is_image(entry.name)]
+    except FileNotFoundError:
+        return aliases
+
+    migrated = 0
+    for entry in legacy:
+        try:
+            mtime = entry.stat().st_mtime
+            target_dir = _shard_dir(image_dir, LEGACY_DIR, mtime)
+            target = os.path.join(target_dir, entry.name)
+            os.makedirs(target_dir, exist_ok=True)
+            if os.path.exists(target):
+                if os.path.samefile(target, entry.path):
+                    aliases[target] = entry.path
+                continue
+            try:
+                os.link(entry.path, target)
+                aliases[target] = entry.path
+            except OSError:
+                os.replace(entry.path, target)
+            migrated += 1
+        except Exception as e:
+            _LOGGER.error("Error migrating image %s: %s", entry.path, e)
+    if migrated:
+        _LOGGER.info("Migrated %d images to the sharded layout", migrated)
+    return aliases
+
+
+def _scan_blobs(blob_dir: str) -> dict:
+    """Return blob files by inode as (digest, StoredBlob)."""
+    blobs = {}
+    for root, _, files in os.walk(blob_dir):
+        for name in files:
+            if name.endswith(THUMBNAIL_SUFFIX):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            digest = os.path.splitext(name)[0]
+            size = st.st_size
+            try:
+                size += os.stat(thumbnail_path(path)).st_size
+            except OSError:
+                pass
+            blobs[st.st_ino] = (digest, StoredBlob(path, size))
+    return blobs
+
+
+def _scan_images(image_dir: str) -> tuple:
+    """Migrate legacy images and return the index, oldest first.
+
+    Returns:
+        tuple: List of StoredImage and dict of StoredBlob by digest
+    """
+    aliases = _migrate_legacy_images(image_dir)
+    blobs_by_inode = _scan_blobs(os.path.join(image_dir, BLOB_DIR))
+    entries = []
+    try:
+        devices = [entry for entry in os.scandir(image_dir)
+                   if entry.is_dir() and entry.name != BLOB_DIR]
+    except FileNotFoundError:
+        devices = []
+
+    for device in devices:
+        eui = None if device.name == LEGACY_DIR else device.name
+        for root, _, files in os.walk(device.path):
+            for name in files:
+                if not _is_image(name):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                digest = None
+                size = st.st_size
+                blob = blobs_by_inode.get(st.st_ino)
+                if blob is not None:
+                    digest = blob[0]
+                    size = blob[1].size
+                else:
+                    try:
+                        size += os.stat(thumbnail_path(path)).st_size
+                    except OSError:
+                        pass
+                entries.append(StoredImage(_image_time(name, st.st_mtime), path, eui,
+                                           aliases.get(path), size, digest))
+    entries.sort(key=lambda entry: entry.mtime)
+    blobs = dict(blobs_by_inode.values())
+    return entries, blobs
+
+
+def _remove_images(paths: list, day_dirs: list):
+    """Remove image files and whole day directories."""
+    for day_dir in day_dirs:
+        try:
+            shutil.rmtree(day_dir)
+            _LOGGER.debug("Removed image directory: %s", day_dir)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            _LOGGER.error("Error removing directory %s: %s", day_dir, e)
+            continue
+        # Drop the month and year directories once they are empty
+        parent = os.path.dirname(day_dir)
+        for _ in range(2):
+            try:
+                os.rmdir(parent)
+            except OSError:
+                break
+            parent = os.path.dirname(parent)
+
+    for path in paths:
+        try:
+            os.remove(path)
+            _LOGGER.debug("Removed image: %s", path)
+        except FileNotFoundError:
+            _LOGGER.debug("File already removed: %s", path)
+        except Exception as e:
+            _LOGGER.error("Error removing file %s: %s", path, e)
+
+
+class DeviceImages:
+    """Stored images and retention limits of one device."""
+
+    def __init__(self):
+        self.entries = deque()
+        # Bytes of the images and blobs accounted to the device
+        self.bytes = 0
+        self.max_images = DEFAULT_MAX_IMAGES
+        self.retention_days = DEFAULT_RETENTION_DAYS
+        self.max_bytes = 0  # 0 means no quota
+
+
+class ImageStore:
+    """In-memory index of stored images ordered by timestamp.
+
+    The index is built once from the image directory in the executor and
+    then kept up to date as images are saved, so retention only pops the
+    oldest entries instead of scanning the directory. Storage usage is
+    counted the same way, per device and in total.
+    """
+    _instance = None
+
+    def __new__(cls, hass: HomeAssistant, image_dir: str):
+        if cls._instance is None:
+            cls._instance = super(ImageStore, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, hass: HomeAssistant, image_dir: str):
+        if self._initialized:
+            return
+        self.hass = hass
+        self.image_dir = image_dir
+        self.www_dir = hass.config.path('www')
+        self.blob_dir = os.path.join(image_dir, BLOB_DIR)
+        self.index = EventIndex(hass, hass.config.path(EVENT_DB))
+        self.cache = ImageCache(hass)
+        self.total_bytes = 0
+        self._quotas = {}  # Total quota requested per device
+        self._devices = {}
+        self._count = 0
+        self._blobs = {}
+        self._pending = []
+        self._listeners = []
+        self._loaded = False
+        self._load_task = None
+        self._initialized = True
+
+    def __len__(self) -> int:
+        return self._count + len(self._pending)
+
+    @property
+    def max_total_bytes(self) -> int:
+        """Return the quota for all images, 0 if unlimited.
+
+        Every device may ask for a total quota, the smallest one applies.
+        """
+        quotas = [quota for quota in self._quotas.values() if quota]
+        return min(quotas) if quotas else 0
+
+    def _device(self, eui: str | None) -> DeviceImages:
+        device = self._devices.get(eui)
+        if device is None:
+            device = self._devices[eui] = DeviceImages()
+        return device
+
+    def configure(self, eui: str, max_images: int = DEFAULT_MAX_IMAGES,
+                  retention_days: int = DEFAULT_RETENTION_DAYS,
+                  max_bytes: int = 0, max_total_bytes: int = 0):
+        """Set the retention limits of a device.
+
+        Args:
+            eui: Device EUI
+            max_images: Number of images to keep for the device
+            retention_days: Number of days to keep images for
+            max_bytes: Storage quota of the device in bytes, 0 for none
+            max_total_bytes: Storage quota of all devices in bytes, 0 for none
+        """
+        key = _device_dir(eui)
+        device = self._device(key)
+        device.max_images = max_images
+        device.retention_days = retention_days
+        device.max_bytes = max_bytes
+        self._quotas[key] = max_total_bytes
+        if self.async_enforce():
+            self._notify()
+
+    def release(self, eui: str):
+        """Drop the total quota of a device that is no longer set up."""
+        self._quotas.pop(_device_dir(eui), None)
+
+    def usage(self, eui: str) -> tuple:
+        """Return the bytes and number of images stored for a device."""
+        device = self._devices.get(_device_dir(eui))
+        if device is None:
+            return 0, 0
+        return device.bytes, len(device.entries)
+
+    @callback
+    def async_add_listener(self, update_callback) -> callable:
+        """Call back when the storage usage changes.
+
+        Returns:
+            callable: Function removing the listener
+        """
+        self._listeners.append(update_callback)
+
+        def remove_listener():
+            self._listeners.remove(update_callback)
+        return remove_listener
+
+    def image_path(self, eui: str, mtime: float, name: str) -> str:
+        """Return the path to store a new image of a device."""
+        return os.path.join(_shard_dir(self.image_dir, _device_dir(eui), mtime), name)
+
+    def image_url(self, path: str) -> str:
+        """Return the /local URL an image is served from."""
+        relative = os.path.relpath(path, self.www_dir)
+        return "/local/" + relative.replace(os.sep, "/")
+
+    def async_load(self):
+        """Build the index in the background if it is not built yet."""
+        if self._loaded or self._load_task is not None:
+            return
+        self._load_task = self.hass.async_create_background_task(
+            self._async_load(), "sensecraft image index")
+
+    async def _async_load(self):
+        """Migrate legacy images, scan the image directory once and build the index."""
+        try:
+            entries, blobs = await self.hass.async_add_executor_job(
+                _scan_images, self.image_dir)
+        except Exception as e:
+            _LOGGER.error("Error indexing images in %s: %s", self.image_dir, e)
+            entries, blobs = [], {}
+        # Images saved while scanning are newer than everything on disk
+        known = {entry.path for entry in self._pending}
+        entries = [entry for entry in entries if entry.path not in known]
+        entries.extend(self._pending)
+        self._pending = []
+
+        # Count references and bytes once the index is complete
+        blobs.update(self._blobs)
+        for blob in blobs.values():
+            blob.refs = 0
+        for entry in entries:
+            self._device(entry.eui).entries.append(entry)
+            blob = blobs.get(entry.digest) if entry.digest is not None else None
+            if blob is None:
+                self._charge(entry.eui, entry.size)
+                continue
+            if not blob.refs:
+                blob.eui = entry.eui
+                self._charge(entry.eui, blob.size)
+            blob.refs += 1
+        self._count = len(entries)
+        orphans = [digest for digest, blob in blobs.items() if not blob.refs]
+        self._blobs = blobs
+        self._loaded = True
+        self._load_task = None
+        _LOGGER.debug("Indexed %d images (%d blobs, %d bytes) in %s",
+                      self._count, len(blobs), self.total_bytes, self.image_dir)
+        if entries:
+            rows = [(entry.eui or LEGACY_DIR, entry.mtime, "", entry.path, entry.size,
+                     entry.digest) for entry in entries]
+            self.hass.async_add_executor_job(self.index.backfill, rows)
+        if orphans:
+            files = []
+            for digest in orphans:
+                blob = self._blobs.pop(digest)
+                files.append(blob.path)
+                files.append(thumbnail_path(blob.path))
+            self.hass.async_add_executor_job(_remove_images, files, [])
+        self.async_enforce()
+        self._notify()
+
+    def add(self, path: str, eui: str, mtime: float | None = None, size: int = 0,
+            digest: str | None = None, blob: str | None = None, alarm: str = ""):
+        """Record a newly saved image.
+
+        Args:
+            path: Event image path
+            eui: Device EUI
+            mtime: Event timestamp
+            size: Bytes written for the image and its thumbnail
+            digest: Content hash of the blob the image is linked to
+            blob: Blob path
+            alarm: Alarm text of the event
+        """
+        key = _device_dir(eui)
+        entry = StoredImage(
+            mtime if mtime is not None else time.time(), path, key,
+            size=size, digest=digest)
+        stored = self._blobs.get(digest) if digest is not None else None
+        self.index.add(key, entry.mtime, alarm, path,
+                       stored.size if stored is not None else size, digest)
+        if not self._loaded:
+            if digest is not None and stored is None:
+                self._blobs[digest] = StoredBlob(blob, size, key)
+            self._pending.append(entry)
+            return
+
+        self._device(key).entries.append(entry)
+        self._count += 1
+        if digest is None:
+            self._charge(key, size)
+        else:
+            if stored is None:
+                stored = self._blobs[digest] = StoredBlob(blob, size, key)
+                self._charge(key, size)
+            stored.refs += 1
+        self.async_enforce()
+        self._notify()
+
+    def _charge(self, eui: str | None, size: int):
+        """Account stored bytes to a device."""
+        self._device(eui).bytes += size
+        self.total_bytes += size
+
+    def _oldest(self) -> DeviceImages | None:
+        """Return the device holding the oldest image."""
+        oldest = None
+        for candidate in self._devices.values():
+            if candidate.entries and (
+                    oldest is None or candidate.entries[0].mtime < oldest.entries[0].mtime):
+                oldest = candidate
+        return oldest
+
+    def _evict(self, device: DeviceImages, expired_files: list, whole_day: bool = False):
+        """Drop the oldest image of a device and release its bytes."""
+        entry = device.entries.popleft()
+        self._count -= 1
+        if not whole_day:
+            expired_files.append(entry.path)
+            expired_files.append(thumbnail_path(entry.path))
+        if entry.alias:
+            expired_files.append(entry.alias)
+        if entry.digest is None or entry.digest not in self._blobs:
+            self._charge(entry.eui, -entry.size)
+            return entry
+        blob = self._blobs[entry.digest]
+        blob.refs -= 1
+        if blob.refs <= 0:
+            # 没有事件引用时才删除数据
+            del self._blobs[entry.digest]
+            self._charge(blob.eui, -blob.size)
+            if blob.path:
+                expired_files.append(blob.path)
+                expired_files.append(thumbnail_path(blob.path))
+        return entry
+
+    def async_enforce(self) -> bool:
+        """Evict images past the retention period, the count limit or a quota.
+
+        Images past the retention period are dropped a whole day at a time,
+        the other limits evict the oldest images first.
+
+        Returns:
+            bool: True if any image was evicted
+        """
+        if not self._loaded:
+            return False
+        now = time.time()
+        expired_dirs = set()
+        expired_files = []
+        removed = []
+
+        for device in self._devices.values():
+            cutoff = datetime.fromtimestamp(now - device.retention_days * 86400)
+            cutoff = cutoff.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+            entries = device.entries
+            while entries and entries[0].mtime < cutoff:
+                entry = self._evict(device, expired_files, whole_day=True)
+                expired_dirs.add(entry.day_dir)
+                removed.append(entry.path)
+            while len(entries) > device.max_images:
+                removed.append(self._evict(device, expired_files).path)
+            while device.max_bytes and device.bytes > device.max_bytes and entries:
+                removed.append(self._evict(device, expired_files).path)
+
+        max_total_bytes = self.max_total_bytes
+        while max_total_bytes and self.total_bytes > max_total_bytes:
+            device = self._oldest()
+            if device is None:
+                break
+            removed.append(self._evict(device, expired_files).path)
+
+        if not removed:
+            return False
+        # 索引和文件一起删除
+        self.index.remove(removed)
+        for path in removed:
+            self.cache.discard(path)
+            self.cache.discard(thumbnail_path(path))
+        self.hass.async_add_executor_job(
+            _remove_images, expired_files, list(expired_dirs))
+        return True
+
+    async def async_query_events(self, eui: str | None = None, start: float | None = None,
+                                 end: float | None = None, limit: int = DEFAULT_PAGE_SIZE,
+                                 cursor: str | None = None) -> dict:
+        """Return a page of indexed events, newest first.
+
+        Args:
+            eui: Device EUI, None for all devices
+            start: Oldest event timestamp, inclusive
+            end: Newest event timestamp, exclusive
+            limit: Page size
+            cursor: Cursor returned with the previous page
+
+        Returns:
+            dict: Events with image URLs and the cursor of the next page
+        """
+        rows, next_cursor = await self.index.async_query(
+            _device_dir(eui) if eui is not None else None, start, end, limit, cursor)
+        events = []
+        for _, device, ts, alarm, path, size, digest in rows:
+            events.append({
+                "device_id": device,
+                "timestamp": datetime.fromtimestamp(ts).astimezone().isoformat(),
+                "alarm_text": alarm or "",
+                "image_url": self.image_url(path),
+                "thumbnail_url": self.image_url(thumbnail_path(path)),
+                "size": size,
+                "hash": digest,
+            })
+        return {"events": events, "next_cursor": next_cursor}
+
+    def _notify(self):
+        """Tell listeners the storage usage changed."""
+        for update_callback in list(self._listeners):
+            update_callback()
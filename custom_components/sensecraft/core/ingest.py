@@ -0,0 +1,143 @@
+"""Bounded ingest queue for the device HTTP endpoints."""
+import asyncio
+import logging
+import math
+import time
+from homeassistant.core import HomeAssistant
+from .metrics import INGEST_QUEUE_DEPTH, INGEST_QUEUE_WAIT, INGEST_REJECTED
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class IngestQueue:
+    """Bounded work queue drained by a fixed pool of workers for one route."""
+
+    def __init__(self, hass: HomeAssistant, path: str, workers: int = 2, max_queue: int = 32):
+        """Initialize the ingest queue.
+
+        Args:
+            hass: Home Assistant instance
+            path: Route served by this queue, used for logging and task names
+            workers: Number of handlers allowed to run concurrently
+            max_queue: Number of requests allowed to wait for a worker
+        """
+        self.hass = hass
+        self.path = path
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = []
+
+        # Statistics behind the Retry-After estimate
+        self.rejected = 0
+        self.processed = 0
+        self.busy = 0
+        self.service_time_total = 0.0
+        self._wait_metric = INGEST_QUEUE_WAIT.labels(path)
+        self._rejected_metric = INGEST_REJECTED.labels(path)
+        INGEST_QUEUE_DEPTH.labels(path).set_function(self._queue.qsize)
+
+    @property
+    def depth(self) -> int:
+        """Return the number of requests waiting for a worker."""
+        return self._queue.qsize()
+
+    @property
+    def running(self) -> bool:
+        """Return True if the workers are running."""
+        return bool(self._tasks)
+
+    @property
+    def retry_after(self) -> int:
+        """Estimate in seconds when a rejected client should retry."""
+        if self.processed:
+            service_time = self.service_time_total / self.processed
+        else:
+            service_time = 1.0
+        return max(1, math.ceil(service_time * (self.depth + self.busy) / self.workers))
+
+    def configure(self, workers: int):
+        """Change the number of handlers allowed to run concurrently.
+
+        New workers start right away, surplus ones exit after the request
+        they are waiting for.
+        """
+        self.workers = max(1, workers)
+        if self._tasks:
+            self._spawn()
+
+    def start(self):
+        """Start the worker pool."""
+        if self._tasks:
+            return
+        self._spawn()
+        _LOGGER.debug("Started %d ingest workers for %s (queue size %d)",
+                      self.workers, self.path, self.max_queue)
+
+    def _spawn(self):
+        for index in range(len(self._tasks), self.workers):
+            self._tasks.append(self.hass.async_create_background_task(
+                self._worker(), f"sensecraft ingest {self.path} #{index}"))
+
+    def stop(self):
+        """Stop the worker pool and fail all queued requests."""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        while not self._queue.empty():
+            _, _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+
+    def submit(self, handler, request) -> asyncio.Future:
+        """Queue a request for a worker.
+
+        Returns:
+            asyncio.Future: Resolved with the handler result
+
+        Raises:
+            asyncio.QueueFull: If the queue is saturated
+        """
+        future = self.hass.loop.create_future()
+        self._queue.put_nowait((handler, request, future, time.monotonic()))
+        return future
+
+    def reject(self):
+        """Record a request rejected because the queue was saturated."""
+        self.rejected += 1
+        self._rejected_metric.inc()
+        if self.rejected == 1 or self.rejected % 100 == 0:
+            _LOGGER.warning("Ingest queue for %s is saturated (%d rejected so far)",
+                            self.path, self.rejected)
+
+    async def _worker(self):
+        """Run queued handlers one at a time."""
+        while True:
+            if len(self._tasks) > self.workers:
+                # The pool was shrunk by configure()
+                self._tasks.remove(asyncio.current_task())
+                return
+            handler, request, future, enqueued = await self._queue.get()
+            if future.done():
+                # The client went away while the request was queued
+                continue
+
+            started = time.monotonic()
+            self._wait_metric.observe(started - enqueued)
+
+            self.busy += 1
+            try:
+                result = await handler(request)
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.busy -= 1
+                self.processed += 1
+                self.service_time_total += time.monotonic() - started
@@ -0,0 +1,72 @@
+"""Latest-wins handoff of camera frames to a processing task."""
+import asyncio
+import logging
+from homeassistant.core import HomeAssistant, callback
+from .metrics import FRAMES_DROPPED, FRAMES_RECEIVED
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class FrameMailbox:
+    """Single-slot mailbox between a frame reader and frame processing.
+
+    The reader only stores the frame and returns to the socket. A separate
+    task processes the newest frame; a frame that arrives
+    while the previous one is still waiting replaces it and is counted as
+    dropped, so a slow consumer lags by at most one frame.
+    """
+
+    def __init__(self, hass: HomeAssistant, device_id: str, handler):
+        """Initialize the mailbox.
+
+        Args:
+            hass: Home Assistant instance
+            device_id: Device the frames come from
+            handler: Coroutine function processing one frame
+        """
+        self.hass = hass
+        self.device_id = device_id
+        self._handler = handler
+        self._frame = None
+        self._event = asyncio.Event()
+        self._task = None
+        self.received = 0
+        self.dropped = 0
+        self._received_metric = FRAMES_RECEIVED.labels(device_id)
+        self._dropped_metric = FRAMES_DROPPED.labels(device_id)
+
+    @callback
+    def put(self, frame):
+        """Store a frame, replacing the one not yet processed."""
+        self.received += 1
+        self._received_metric.inc()
+        if self._frame is not None:
+            self.dropped += 1
+            self._dropped_metric.inc()
+        self._frame = frame
+        self._event.set()
+
+    def start(self):
+        """Start the processing task."""
+        if self._task is None:
+            self._task = self.hass.async_create_background_task(
+                self._run(), f"sensecraft frames {self.device_id}")
+
+    def stop(self):
+        """Stop the processing task and drop the waiting frame."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._frame = None
+
+    async def _run(self):
+        while True:
+            await self._event.wait()
+            self._event.clear()
+            frame, self._frame = self._frame, None
+            if frame is None:
+                continue
+            try:
+                await self._handler(frame)
+            except Exception as e:
+                _LOGGER.error("Error processing frame from %s: %s", self.device_id, e)
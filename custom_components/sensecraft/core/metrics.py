@@ -0,0 +1,368 @@
+"""Prometheus-style metrics for Sensecraft.
+
+Metric children are resolved once (per route, per device) and kept by the
+caller, so recording a sample on the hot path only updates preallocated
+slots and never builds label tuples or strings.
+"""
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RECOVERY_BUCKETS = (1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144,
+                1048576, 4194304, 16777216)
+
+
+def _escape(value) -> str:
+    """Escape a label value for the text exposition format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    """Format a label set."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    if not pairs:
+        return ""
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value) -> str:
+    """Format a sample value."""
+    if value == float('inf'):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class _CounterChild:
+    """A single counter time series."""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        """Increment the counter."""
+        self.value += amount
+
+
+class _GaugeChild:
+    """A single gauge time series."""
+
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        """Set the gauge value."""
+        self.value = value
+
+    def inc(self, amount=1):
+        """Increment the gauge."""
+        self.value += amount
+
+    def dec(self, amount=1):
+        """Decrement the gauge."""
+        self.value -= amount
+
+    def set_function(self, function):
+        """Compute the gauge value at scrape time."""
+        self.function = function
+
+    def get(self):
+        """Return the current value."""
+        if self.function is not None:
+            return self.function()
+        return self.value
+
+
+class _HistogramChild:
+    """A single histogram time series."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Record an observation."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    """Base class for a metric family."""
+
+    TYPE = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Return the child for a label set, creating it if needed.
+
+        Callers on a hot path should keep the returned child.
+        """
+        if len(values) != len(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {values}")
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def remove(self, *values):
+        """Drop the child for a label set."""
+        self._children.pop(values, None)
+
+    def collect(self):
+        """Yield the exposition lines of this family."""
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.TYPE}"
+        for values, child in list(self._children.items()):
+            yield from self._samples(values, child)
+
+    def _samples(self, values, child):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+
+    TYPE = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        """Increment the unlabelled counter."""
+        self._children[()].inc(amount)
+
+    def _samples(self, values, child):
+        labels = _format_labels(self.labelnames, values)
+        yield f"{self.name}{labels} {_format_value(child.value)}"
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    TYPE = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        """Set the unlabelled gauge."""
+        self._children[()].set(value)
+
+    def set_function(self, function):
+        """Compute the unlabelled gauge at scrape time."""
+        self._children[()].set_function(function)
+
+    def _samples(self, values, child):
+        labels = _format_labels(self.labelnames, values)
+        yield f"{self.name}{labels} {_format_value(child.get())}"
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed buckets."""
+
+    TYPE = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        """Record an observation on the unlabelled histogram."""
+        self._children[()].observe(value)
+
+    def _samples(self, values, child):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+            cumulative += count
+            labels = _format_labels(
+                self.labelnames, values, ("le", _format_value(float(bound))))
+            yield f"{self.name}_bucket{labels} {cumulative}"
+        labels = _format_labels(self.labelnames, values)
+        yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+        yield f"{self.name}_count{labels} {child.count}"
+
+
+class MetricsRegistry:
+    """Collection of metric families rendered together."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        """Get or create a counter."""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        """Get or create a gauge."""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames=(),
+                  buckets=LATENCY_BUCKETS) -> Histogram:
+        """Get or create a histogram."""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Render all metrics in the text exposition format."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.collect())
+        lines.append("")
+        return "\n".join(lines)
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_RESPONSES = REGISTRY.counter(
+    "sensecraft_http_responses_total",
+    "Responses sent by the ingest server by route and result code.",
+    ("route", "code"))
+HTTP_REQUEST_BYTES = REGISTRY.histogram(
+    "sensecraft_http_request_size_bytes",
+    "Size of request payloads received by the ingest server.",
+    ("route",), SIZE_BUCKETS)
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "sensecraft_http_request_duration_seconds",
+    "Time from receiving a request to sending the response.",
+    ("route",))
+INGEST_QUEUE_DEPTH = REGISTRY.gauge(
+    "sensecraft_ingest_queue_depth",
+    "Requests waiting for an ingest worker.",
+    ("route",))
+INGEST_QUEUE_WAIT = REGISTRY.histogram(
+    "sensecraft_ingest_queue_wait_seconds",
+    "Time requests spent waiting for an ingest worker.",
+    ("route",))
+INGEST_REJECTED = REGISTRY.counter(
+    "sensecraft_ingest_rejected_total",
+    "Requests rejected because the ingest queue was saturated.",
+    ("route",))
+DEVICE_REQUESTS = REGISTRY.counter(
+    "sensecraft_device_requests_total",
+    "Requests handled per device.",
+    ("route", "device"))
+DEVICE_ERRORS = REGISTRY.counter(
+    "sensecraft_device_errors_total",
+    "Requests per device that the handler rejected or failed on.",
+    ("route", "device"))
+DEVICE_REQUEST_DURATION = REGISTRY.histogram(
+    "sensecraft_device_handler_duration_seconds",
+    "Time spent in the device handler per device.",
+    ("route", "device"))
+HTTP_HANDLERS = REGISTRY.gauge(
+    "sensecraft_http_handlers",
+    "Device handlers registered on the ingest server.")
+WS_CLIENTS = REGISTRY.gauge(
+    "sensecraft_websocket_clients",
+    "Open WebSocket connections to devices.")
+CONTROL_LATENCY = REGISTRY.histogram(
+    "sensecraft_control_latency_seconds",
+    "Time from submitting a control command to receiving the device response.",
+    ("device", "command"))
+CONTROL_SUPERSEDED = REGISTRY.counter(
+    "sensecraft_control_superseded_total",
+    "Control commands replaced by a newer one before they were sent.",
+    ("device", "command"))
+WS_RECONNECT_ATTEMPTS = REGISTRY.counter(
+    "sensecraft_websocket_reconnect_attempts_total",
+    "WebSocket reconnect attempts by result.",
+    ("result",))
+WS_RECONNECT_WAITING = REGISTRY.gauge(
+    "sensecraft_websocket_reconnect_waiting",
+    "Disconnected WebSocket clients waiting for their next reconnect attempt.")
+FRAMES_RECEIVED = REGISTRY.counter(
+    "sensecraft_camera_frames_received_total",
+    "Camera frames received over the WebSocket.",
+    ("device",))
+FRAMES_DROPPED = REGISTRY.counter(
+    "sensecraft_camera_frames_dropped_total",
+    "Camera frames replaced by a newer one before they were processed.",
+    ("device",))
+WS_STALLS = REGISTRY.counter(
+    "sensecraft_websocket_stalls_total",
+    "Frame streams closed by the stall watchdog.",
+    ("device",))
+WS_STALL_RECOVERY = REGISTRY.histogram(
+    "sensecraft_websocket_stall_recovery_seconds",
+    "Time from detecting a stalled frame stream to the next frame received.",
+    ("device",), RECOVERY_BUCKETS)
+OVERLAY_POOL_SIZE = REGISTRY.gauge(
+    "sensecraft_overlay_pool_workers",
+    "Workers in the detection overlay render pool.")
+OVERLAY_POOL_BUSY = REGISTRY.gauge(
+    "sensecraft_overlay_pool_busy",
+    "Overlay renders running in the pool.")
+CAMERA_STREAM_VIEWERS = REGISTRY.gauge(
+    "sensecraft_camera_stream_viewers",
+    "Clients connected to the MJPEG stream of a camera.",
+    ("camera",))
+
+
+class DeviceMetrics:
+    """Pre-resolved metric children for one device on one route."""
+
+    __slots__ = ("requests", "errors", "duration")
+
+    def __init__(self, route: str, device: str):
+        self.requests = DEVICE_REQUESTS.labels(route, device)
+        self.errors = DEVICE_ERRORS.labels(route, device)
+        self.duration = DEVICE_REQUEST_DURATION.labels(route, device)
+
+
+# Label of requests that name no configured device
+UNKNOWN_DEVICE = "unknown"
+
+
+class RouteMetrics:
+    """Pre-resolved metric children for one ingest route."""
+
+    __slots__ = ("route", "request_bytes", "duration", "_responses")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.request_bytes = HTTP_REQUEST_BYTES.labels(route)
+        self.duration = HTTP_REQUEST_DURATION.labels(route)
+        self._responses = {}
+
+    def response(self, code):
+        """Return the response counter for a result code."""
+        child = self._responses.get(code)
+        if child is None:
+            child = self._responses[code] = HTTP_RESPONSES.labels(self.route, code)
+        return child
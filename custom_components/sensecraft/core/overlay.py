@@ -0,0 +1,133 @@
+"""Detection overlay rendering for ReCamera frames.
+
+Decoding a frame, drawing the detections and encoding it again takes tens
+of milliseconds. Rendering runs in a small process pool; frame bytes are
+handed to the workers through shared memory and drawn by overlay_render.
+Where worker processes cannot be started, a thread pool is used instead.
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+import site
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import HomeAssistant
+from .metrics import OVERLAY_POOL_BUSY, OVERLAY_POOL_SIZE
+
+_LOGGER = logging.getLogger(__name__)
+
+POOL_WORKERS = 2
+
+_RENDER_DIR = os.path.dirname(os.path.abspath(__file__))
+_RENDER_MODULE = "overlay_render"
+
+
+def _import_render_module():
+    """Import overlay_render as a top-level module.
+
+    Workers unpickle the render functions by module name. Imported through
+    the package, every worker would import the integration and Home
+    Assistant; as a top-level module found on the worker path it only
+    needs PIL.
+    """
+    module = sys.modules.get(_RENDER_MODULE)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(
+            _RENDER_MODULE, os.path.join(_RENDER_DIR, f"{_RENDER_MODULE}.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[_RENDER_MODULE] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+overlay_render = _import_render_module()
+
+
+class OverlayRenderer:
+    """Bounded pool rendering detection overlays off the event loop."""
+
+    _instance = None
+
+    def __new__(cls, hass: HomeAssistant):
+        if cls._instance is None:
+            cls._instance = super(OverlayRenderer, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, hass: HomeAssistant):
+        if self._initialized:
+            return
+        self.hass = hass
+        self.workers = POOL_WORKERS
+        self.busy = 0
+        self._executor = None
+        self._processes = False
+        self._slots = asyncio.Semaphore(self.workers)
+        OVERLAY_POOL_SIZE.set(self.workers)
+        OVERLAY_POOL_BUSY.set_function(lambda: self.busy)
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, self._async_stop)
+        self._initialized = True
+
+    def _get_executor(self):
+        if self._executor is None:
+            try:
+                # spawn: forking the multi-threaded Home Assistant process is unsafe
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=get_context("spawn"),
+                    initializer=site.addsitedir, initargs=(_RENDER_DIR,))
+                self._processes = True
+            except Exception as e:
+                self._use_threads(e)
+        return self._executor
+
+    def _use_threads(self, reason):
+        _LOGGER.warning("Overlay process pool unavailable, using threads: %s", reason)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="sensecraft_overlay")
+        self._processes = False
+
+    async def async_render(self, image_bytes, data: dict) -> bytes:
+        """Render the detections onto a frame.
+
+        Args:
+            image_bytes: JPEG frame
+            data: Frame metadata with boxes, labels, ...
+
+        Returns:
+            bytes: JPEG frame with the overlay
+        """
+        async with self._slots:
+            self.busy += 1
+            try:
+                executor = self._get_executor()
+                if self._processes:
+                    try:
+                        return await self._async_render_shared(executor, image_bytes, data)
+                    except (BrokenProcessPool, OSError) as e:
+                        self._use_threads(e)
+                        executor = self._executor
+                return await self.hass.loop.run_in_executor(
+                    executor, overlay_render.render_overlay, image_bytes, data)
+            finally:
+                self.busy -= 1
+
+    async def _async_render_shared(self, executor, image_bytes, data: dict) -> bytes:
+        size = len(image_bytes)
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            shm.buf[:size] = image_bytes
+            return await self.hass.loop.run_in_executor(
+                executor, overlay_render.render_shared, shm.name, size, data)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    async def _async_stop(self, event):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
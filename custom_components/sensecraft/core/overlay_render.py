@@ -0,0 +1,360 @@
+"""Detection overlay drawing for ReCamera frames.
+
+Runs in the overlay worker processes, so it only depends on PIL: the
+workers import this file as a top-level module instead of importing the
+integration and Home Assistant with it.
+"""
+import io
+import logging
+from multiprocessing import shared_memory
+from PIL import Image, ImageDraw
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _ViewReader(io.RawIOBase):
+    """Read-only file over a memoryview, lets PIL decode without a copy."""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        chunk = self._view[self._pos:self._pos + len(buffer)]
+        size = len(chunk)
+        buffer[:size] = chunk
+        self._pos += size
+        return size
+
+
+def render_overlay(image_bytes, data: dict) -> bytes:
+    """Decode a JPEG, draw the detections on it and encode it again."""
+    image = Image.open(_ViewReader(memoryview(image_bytes)))
+    draw_detections(image, data)
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def render_shared(name: str, size: int, data: dict) -> bytes:
+    """Render a frame stored in shared memory. Runs in a worker process."""
+    # The parent owns the segment and unlinks it; spawned workers share
+    # its resource tracker, so attaching here registers nothing new
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        view = shm.buf[:size]
+        try:
+            # Decoded straight from the segment, which stays open until
+            # the frame is encoded again
+            return render_overlay(view, data)
+        finally:
+            view.release()
+    finally:
+        shm.close()
+
+
+def draw_detections(image, data):
+    """Draw all visualization elements on the image."""
+    try:
+        # 获取图像尺寸
+        width, height = image.size
+        # 创建 ImageDraw 对象
+        draw = ImageDraw.Draw(image)
+
+        # 根据JavaScript代码定义颜色列表
+        COLORS_HEX = [
+            "#FF0000", "#FF4500", "#FF6347", "#FF8C00", "#FFA500",
+            "#FFD700", "#32CD32", "#006400", "#4169E1", "#0000FF",
+            "#1E90FF", "#00FFFF", "#00CED1", "#20B2AA", "#FF1493",
+            "#FF69B4", "#800080", "#8A2BE2", "#9400D3", "#9932CC"
+        ]
+
+        # 将十六进制颜色转换为RGB元组
+        COLORS = []
+        for hex_color in COLORS_HEX:
+            r = int(hex_color[1:3], 16)
+            g = int(hex_color[3:5], 16)
+            b = int(hex_color[5:7], 16)
+            COLORS.append((r, g, b))
+
+        # 绘制线条 (lines)
+        if 'lines' in data:
+            for i, line in enumerate(data['lines']):
+                if len(line) >= 4:
+                    x1 = int(line[0] * 0.01 * width)
+                    y1 = int(line[1] * 0.01 * height)
+                    x2 = int(line[2] * 0.01 * width)
+                    y2 = int(line[3] * 0.01 * height)
+                    color = COLORS[i % len(COLORS)]
+                    draw.line([(x1, y1), (x2, y2)], fill=color, width=1)
+
+        # 绘制分类结果 (classes)
+        if 'classes' in data:
+            rect_height = height / 16
+            for i, cls in enumerate(data['classes']):
+                if len(cls) >= 2:
+                    score, tar = cls
+                    label_text = data['labels'][i] if 'labels' in data and i < len(
+                        data['labels']) else f"NA-{tar}"
+                    rect_width = width / len(data['classes'])
+                    color = COLORS[int(tar) % len(COLORS)]
+                    # 绘制矩形
+                    draw.rectangle(
+                        [int(rect_width * i), 0,
+                         int(rect_width * (i + 1)), int(rect_height)],
+                        fill=color,
+                        outline=color
+                    )
+                    # 绘制文本
+                    draw.text(
+                        (int(rect_width * i + 5), int(rect_height / 2 - 7)),
+                        f"{label_text}: {score}",
+                        fill="white"
+                    )
+
+        # 绘制检测框 (boxes)
+        if 'boxes' in data:
+            for i, box in enumerate(data['boxes']):
+                if len(box) >= 6:
+                    x, y, w, h, score, tar = box
+
+                    # 计算框的坐标
+                    x1 = max(0, int(x - w/2))
+                    y1 = max(0, int(y - h/2))
+                    x2 = min(width, int(x + w/2))
+                    y2 = min(height, int(y + h/2))
+
+                    # 获取颜色
+                    color = COLORS[int(tar) % len(COLORS)]
+
+                    # 绘制矩形框
+                    draw.rectangle([x1, y1, x2, y2],
+                                   outline=color, width=2)
+
+                    # 准备标签文本
+                    label_text = data['labels'][i] if 'labels' in data and i < len(
+                        data['labels']) else f"NA-{tar}"
+
+                    # 构建标签
+                    label = f"{label_text}({score})"
+                    if 'tracks' in data and i < len(data['tracks']):
+                        track_id = data['tracks'][i]
+                        label = f"#{track_id}: {label}"
+
+                    # 绘制标签背景
+                    text_width = draw.textlength(label, font=None)
+                    text_height = 14  # 假定高度为14像素
+                    draw.rectangle(
+                        [x1, y1 - text_height, x1 + text_width, y1],
+                        fill=color
+                    )
+
+                    # 绘制标签文本
+                    draw.text((x1 + 5, y1 - text_height + 2),
+                              label, fill="white")
+
+        # 绘制分割结果 (segments)
+        if 'segments' in data:
+            for i, segment in enumerate(data['segments']):
+                if len(segment) >= 2:
+                    box = segment[0]
+                    polygon = segment[1]
+
+                    # 默认颜色
+                    color = COLORS[i % len(COLORS)]
+
+                    # 如果有框信息，则使用框的类别作为颜色索引
+                    if box and len(box) >= 6:
+                        x, y, w, h, score, tar = box
+                        color = COLORS[int(tar) % len(COLORS)]
+
+                        # 计算框的坐标
+                        x1 = max(0, int(x - w/2))
+                        y1 = max(0, int(y - h/2))
+                        x2 = min(width, int(x + w/2))
+                        y2 = min(height, int(y + h/2))
+
+                        # 绘制矩形框
+                        draw.rectangle([x1, y1, x2, y2],
+                                       outline=color, width=2)
+
+                        # 准备标签文本
+                        label_text = data['labels'][i] if 'labels' in data and i < len(
+                            data['labels']) else f"NA-{tar}"
+
+                        # 构建标签
+                        label = f"{label_text}({score})"
+                        if 'tracks' in data and i < len(data['tracks']):
+                            track_id = data['tracks'][i]
+                            label = f"#{track_id}: {label}"
+
+                        # 绘制标签背景
+                        text_width = draw.textlength(label, font=None)
+                        text_height = 14  # 假定高度为14像素
+                        draw.rectangle(
+                            [x1, y1 - text_height, x1 + text_width, y1],
+                            fill=color
+                        )
+
+                        # 绘制标签文本
+                        draw.text((x1 + 5, y1 - text_height + 2),
+                                  label, fill="white")
+
+                    # 绘制多边形
+                    if polygon:
+                        points = []
+                        for j in range(0, len(polygon), 2):
+                            if j + 1 < len(polygon):
+                                points.append((polygon[j], polygon[j + 1]))
+
+                        if points:
+                            # 绘制多边形轮廓
+                            draw.polygon(points, outline=color)
+
+        # 绘制关键点 (keypoints)
+        if 'keypoints' in data:
+            for i, keypoint_data in enumerate(data['keypoints']):
+                if len(keypoint_data) >= 2:
+                    box = keypoint_data[0]
+                    keypoints = keypoint_data[1]
+
+                    if box and len(box) >= 6 and keypoints:
+                        x, y, w, h, score, tar = box
+
+                        # 计算框的坐标
+                        x1 = max(0, int(x - w/2))
+                        y1 = max(0, int(y - h/2))
+                        x2 = min(width, int(x + w/2))
+                        y2 = min(height, int(y + h/2))
+
+                        # 获取颜色
+                        color = COLORS[int(tar) % len(COLORS)]
+
+                        # 绘制矩形框
+                        draw.rectangle([x1, y1, x2, y2],
+                                       outline=color, width=2)
+
+                        # 准备标签文本
+                        label_text = data['labels'][i] if 'labels' in data and i < len(
+                            data['labels']) else f"NA-{tar}"
+
+                        # 构建标签
+                        label = f"{label_text}({score})"
+                        if 'tracks' in data and i < len(data['tracks']):
+                            track_id = data['tracks'][i]
+                            label = f"#{track_id}: {label}"
+
+                        # 绘制标签背景
+                        text_width = draw.textlength(label, font=None)
+                        text_height = 14  # 假定高度为14像素
+                        draw.rectangle(
+                            [x1, y1 - text_height, x1 + text_width, y1],
+                            fill=color
+                        )
+
+                        # 绘制标签文本
+                        draw.text((x1 + 5, y1 - text_height + 2),
+                                  label, fill="white")
+
+                        # 收集有效的关键点（在框内的点）
+                        valid_points = set()
+                        for j, point in enumerate(keypoints):
+                            if len(point) >= 2:
+                                px, py = point[0], point[1]
+                                target = point[3] if len(point) > 3 else j
+
+                                if px > x1 and px < x2 and py > y1 and py < y2:
+                                    valid_points.add(j)
+
+                                    # 绘制关键点
+                                    point_color = COLORS[target % len(
+                                        COLORS)]
+                                    radius = 3
+                                    draw.ellipse(
+                                        [(px - radius, py - radius),
+                                         (px + radius, py + radius)],
+                                        fill=point_color,
+                                        outline=point_color
+                                    )
+
+                        # 如果是人体姿态点(17个关键点)，绘制骨骼连接线
+                        if len(keypoints) == 17:
+                            # 头部连接
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 0, 1, COLORS, 0)  # 鼻子到左眼
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 0, 2, COLORS, 0)  # 鼻子到右眼
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 1, 3, COLORS, 0)  # 左眼到左耳
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 2, 4, COLORS, 0)  # 右眼到右耳
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 3, 5, COLORS, 0)  # 左耳到左肩
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 4, 6, COLORS, 0)  # 右耳到右肩
+
+                            # 上半身连接
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 5, 6, COLORS, 1)  # 左肩到右肩
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 5, 7, COLORS, 1)  # 左肩到左肘
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 7, 9, COLORS, 1)  # 左肘到左腕
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 6, 8, COLORS, 6)  # 右肩到右肘
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 8, 10, COLORS, 1)  # 右肘到右腕
+
+                            # 躯干连接
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 5, 11, COLORS, 2)  # 左肩到左臀
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 6, 12, COLORS, 2)  # 右肩到右臀
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 11, 12, COLORS, 2)  # 左臀到右臀
+
+                            # 下半身连接
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 11, 13, COLORS, 3)  # 左臀到左膝
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 13, 15, COLORS, 3)  # 左膝到左踝
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 12, 14, COLORS, 3)  # 右臀到右膝
+                            _draw_keypoint_line(
+                                draw, keypoints, valid_points, 14, 16, COLORS, 3)  # 右膝到右踝
+
+    except Exception as e:
+        _LOGGER.error("Error drawing detections: %s", e, exc_info=True)
+
+def _draw_keypoint_line(draw, keypoints, valid_points, idx1, idx2, colors, color_idx=None):
+    """绘制关键点之间的连接线"""
+    if idx1 in valid_points and idx2 in valid_points:
+        point1 = keypoints[idx1]
+        point2 = keypoints[idx2]
+
+        if len(point1) >= 2 and len(point2) >= 2:
+            x1, y1 = point1[0], point1[1]
+            x2, y2 = point2[0], point2[1]
+
+            if color_idx is None:
+                color_idx = idx1
+
+            color = colors[color_idx % len(colors)]
+            draw.line([(x1, y1), (x2, y2)], fill=color, width=2)
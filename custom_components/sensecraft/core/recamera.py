@@ -1,16 +1,38 @@
 """ReCamera platform for Sensecraft."""
+import asyncio
 import logging
+import time
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from .availability import AvailabilityCoordinator
+from .control import ControlDispatcher
+from .frame import FrameStore
 from .http_client import HTTPClient
+from .mailbox import FrameMailbox
 from .ws_client import WSClient
+from .metrics import UNKNOWN_DEVICE, DeviceMetrics
+from ..const import (
+    SERVER_MODE_STANDALONE,
+    CONTROL_TRANSPORT_HTTP,
+    CONTROL_TRANSPORT_WEBSOCKET,
+    DEFAULT_STALL_MULTIPLIER,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+# Requests naming a camera that is not set up
+_UNKNOWN_METRICS = DeviceMetrics(HTTPClient.RECAMERA_STATE_PATH, UNKNOWN_DEVICE)
+
+CONTROL_TIMEOUT = 5  # Seconds to wait for a control response over WebSocket
+NEGOTIATE_TIMEOUT = 3  # Seconds to wait for the protocol hello response
+
 
 class ReCamera():
     """ReCamera platform implementation for Sensecraft devices."""
 
+    # All cameras by serial number, the state route is shared by them
+    _devices = {}
+
     def __init__(self, hass: HomeAssistant, config: dict):
         """Initialize the ReCamera instance.
         
@@ -21,11 +43,12 @@ class ReCamera():
         self.hass = hass
         self.deviceId = config.get('device_id')
         self.deviceHost = config.get('device_host')
+        self.serverMode = config.get('server_mode', SERVER_MODE_STANDALONE)
+        self.controlTransport = config.get('control_transport', CONTROL_TRANSPORT_HTTP)
+        self.stallMultiplier = config.get('stall_multiplier', DEFAULT_STALL_MULTIPLIER)
         self.deviceName = f"sensecraft_recamera_{self.deviceId}"
 
-        self.connected = False
         self.classes = []
-        self._camera_callback = None
         self._event_update_yaw_angle = f"sensecraft_recamera_{self.deviceId}_{0x141}_angle"
         self._event_update_pitch_angle = f"sensecraft_recamera_{self.deviceId}_{0x142}_angle"
         self._event_update_tracking_target = f"sensecraft_recamera_{self.deviceId}_tracking_target"
@@ -33,10 +56,24 @@ class ReCamera():
 
         # WebSocket client instance
         self.ws_client = None
+        # Frames are processed off the receive loop, newest first
+        self.frames = FrameMailbox(hass, self.deviceId, self._async_process_frame)
+        # Newest frame shared by the camera entities
+        self.frame_store = FrameStore(hass)
+
+        # Connection state shared by all entities of the device
+        self.availability = AvailabilityCoordinator(
+            hass, self.deviceId, f"sensecraft_recamera_{self.deviceId}_connection_state")
+
+        # At most one control request in flight per command key
+        self.control = ControlDispatcher(hass, self.deviceId, self._send_control_command)
 
         # Initialize HTTP client singleton and register handler
         self.http_client = HTTPClient(hass)
         self.http_client.handlers[HTTPClient.RECAMERA_STATE_PATH] = self.handle_http_request
+        ReCamera._devices[self.deviceId] = self
+        self._metrics = DeviceMetrics(HTTPClient.RECAMERA_STATE_PATH, self.deviceId)
+        self._server_acquired = False
         _LOGGER.info("ReCamera initialized with device ID: %s", self.deviceId)
 
     async def async_test_connection(self) -> bool:
@@ -77,15 +114,21 @@ class ReCamera():
             _LOGGER.error("Cannot connect: device host not configured")
             return False
 
+        if not self._server_acquired:
+            self.http_client.acquire(self.serverMode)
+            self._server_acquired = True
+
         try:
             # Initialize WebSocket client if not exists
             if not self.ws_client:
                 self.ws_client = WSClient(
-                    self.hass, self.deviceId, self.deviceHost)
+                    self.hass, self.deviceId, self.deviceHost, self.stallMultiplier)
                 # Configure callbacks
                 self.ws_client._message_callback = self._handle_ws_message
                 self.ws_client._state_callback = self._handle_ws_state
+                self.ws_client._text_callback = self._handle_ws_text
 
+            self.frames.start()
             self.ws_client.start()
 
             return True  # Return True to let reconnection mechanism handle subsequent connections
@@ -98,7 +141,12 @@ class ReCamera():
         if self.ws_client:
             await self.ws_client.async_disconnect()
             self.ws_client = None
-        self.connected = False
+        self.availability.async_set(False)
+
+    @property
+    def connected(self) -> bool:
+        """Return True if the device WebSocket is connected."""
+        return self.availability.available
 
     def update_config(self, new_config: dict):
         """Update device configuration.
@@ -129,6 +177,9 @@ class ReCamera():
         return {
             'device_id': self.deviceId,
             'device_host': self.deviceHost,
+            'server_mode': self.serverMode,
+            'control_transport': self.controlTransport,
+            'stall_multiplier': self.stallMultiplier,
         }
 
     @staticmethod
@@ -153,52 +204,124 @@ class ReCamera():
         Returns:
             dict: Response data or error information
         """
+        started = time.monotonic()
+        device, result = await self._handle_http_request(request)
+        # Counted for the camera that sent the request, whichever owns the route
+        metrics = device._metrics if device is not None else _UNKNOWN_METRICS
+        metrics.requests.inc()
+        if result:
+            metrics.errors.inc()
+        metrics.duration.observe(time.monotonic() - started)
+        return result
+
+    async def _handle_http_request(self, request):
+        """Dispatch a ReCamera state update.
+
+        Returns:
+            tuple: Camera named by the request, or None, and the response data
+        """
+        device = None
         try:
             data = await request.json()
-            device_id = data.get('sn')
-            if device_id != self.deviceId:
-                return {
+            device = self._devices.get(data.get('sn'))
+            if device is None:
+                return None, {
                     'code': 400,
                     'msg': "Device ID mismatch",
                     'data': {}
                 }
 
-            event_type = data.get('state')
-            event_data = data.get('data')
-            if event_type == 'update_angle':
-                motor_id = event_data.get('motor_id')
-                if motor_id == 0x141:
-                    self.hass.bus.fire(
-                        self._event_update_yaw_angle,
-                        {"data": event_data}
-                    )
-                elif motor_id == 0x142:
-                    self.hass.bus.fire(
-                        self._event_update_pitch_angle,
-                        {"data": event_data}
-                    )
-            elif event_type == 'update_tracking_target':
-                self.hass.bus.fire(
-                    self._event_update_tracking_target,
-                    {"data": event_data}
-                )
-            elif event_type == 'update_tracking_enable':
-                self.hass.bus.fire(
-                    self._event_update_tracking_enable,
-                    {"data": event_data}
-                )
+            if device.ws_client is not None:
+                # The device just reached us, no need to wait for the backoff
+                device.ws_client.hint()
+            device._dispatch_state(data.get('state'), data.get('data'))
 
-            return {}  # Return empty data on success
+            return device, {}  # Return empty data on success
 
         except Exception as e:
             _LOGGER.error("Error handling ReCamera request: %s", e)
-            return {
+            return device, {
                 'code': 500,
                 'msg': str(e),
                 'data': {}
             }
 
+    def _dispatch_state(self, event_type, event_data):
+        """Fire the bus event for a state update from the device."""
+        if event_type == 'update_angle':
+            motor_id = event_data.get('motor_id')
+            if motor_id == 0x141:
+                self.hass.bus.async_fire(
+                    self._event_update_yaw_angle,
+                    {"data": event_data}
+                )
+            elif motor_id == 0x142:
+                self.hass.bus.async_fire(
+                    self._event_update_pitch_angle,
+                    {"data": event_data}
+                )
+        elif event_type == 'update_tracking_target':
+            self.hass.bus.async_fire(
+                self._event_update_tracking_target,
+                {"data": event_data}
+            )
+        elif event_type == 'update_tracking_enable':
+            self.hass.bus.async_fire(
+                self._event_update_tracking_enable,
+                {"data": event_data}
+            )
+
     async def send_control(self, command_data):
+        """Send control command to device.
+
+        Commands for the same target are coalesced, a command still waiting
+        to be sent is replaced by a newer one.
+
+        Args:
+            command_data: Command data to send
+
+        Returns:
+            dict: Response data of the latest command with the same key,
+            or None if failed
+        """
+        return await self.control.submit(command_data)
+
+    async def _send_control_command(self, command_data):
+        """Send one control command over the WebSocket or HTTP.
+
+        The WebSocket is used when enabled and the device negotiated the
+        control protocol, otherwise the command goes over HTTP.
+        """
+        client = self.ws_client
+        if (self.controlTransport == CONTROL_TRANSPORT_WEBSOCKET and client is not None
+                and client.is_connected and client.protocol_supported):
+            return await self._send_control_ws(client, command_data)
+        return await self._send_control_http(command_data)
+
+    async def _send_control_ws(self, client, command_data):
+        """Send control command to device over the WebSocket.
+
+        Returns:
+            dict: Response data or None if failed
+        """
+        try:
+            response = await client.request({
+                'type': 'control',
+                'sn': self.deviceId,
+                'command_data': command_data,
+            }, CONTROL_TIMEOUT)
+        except asyncio.TimeoutError:
+            _LOGGER.error("Control command to %s timed out: %s", self.deviceId, command_data)
+            return None
+        except ConnectionError:
+            # 连接断开时改用 HTTP
+            return await self._send_control_http(command_data)
+        if 'error' in response:
+            _LOGGER.error("Control command to %s failed: %s", self.deviceId, response['error'])
+            return None
+        return response.get('result')
+
+    async def _send_control_http(self, command_data):
         """Send control command to device via HTTP.
         
         Args:
@@ -240,42 +363,54 @@ class ReCamera():
         Args:
             data: Message data received from WebSocket
         """
-        try:
-            if self._camera_callback:
-                self._camera_callback(data)
-        except Exception as e:
-            _LOGGER.error("Error handling WebSocket message: %s", e)
+        self.frames.put(data)
+
+    async def _async_process_frame(self, data):
+        """Store a frame for the cameras, it is decoded when first viewed.
 
-    def _handle_ws_state(self, connected: bool):
-        """Handle WebSocket connection state changes.
-        
         Args:
-            connected: New connection state
+            data: Newest frame received from WebSocket
         """
-        self.connected = connected
+        if isinstance(data, bytes):
+            self.frame_store.update(data)
 
-        # Broadcast connection state change through event bus
-        self.hass.bus.fire(
-            f"sensecraft_recamera_{self.deviceId}_connection_state",
-            {"connected": connected}
-        )
+    def _handle_ws_text(self, data: dict):
+        """Handle control protocol messages that are not responses.
 
-        _LOGGER.info("WebSocket connection state changed for device %s: %s",
-                     self.deviceId, "connected" if connected else "disconnected")
+        Args:
+            data: Decoded message
+        """
+        if data.get('type') == 'state':
+            self._dispatch_state(data.get('state'), data.get('data'))
 
-    def on_received_camera_image(self, callback):
-        """Set callback for image monitoring.
+    def _handle_ws_state(self, connected: bool):
+        """Handle WebSocket connection state changes.
         
         Args:
-            callback: Callback function to handle received images
+            connected: New connection state
         """
-        self._camera_callback = callback
+        # Reconnect attempts repeat the same state, only transitions count
+        if not self.availability.async_set(connected):
+            return
+        if (connected and self.controlTransport == CONTROL_TRANSPORT_WEBSOCKET
+                and self.ws_client is not None):
+            self.hass.async_create_task(self.ws_client.async_negotiate(NEGOTIATE_TIMEOUT))
 
     def cleanup(self):
         """Clean up all resources and unregister handlers."""
+        if ReCamera._devices.get(self.deviceId) is self:
+            del ReCamera._devices[self.deviceId]
         if self.http_client.handlers[HTTPClient.RECAMERA_STATE_PATH] == self.handle_http_request:
-            self.http_client.handlers[HTTPClient.RECAMERA_STATE_PATH] = None
-
+            # Hand the shared route over to a camera that is still set up
+            other = next(iter(ReCamera._devices.values()), None)
+            self.http_client.handlers[HTTPClient.RECAMERA_STATE_PATH] = (
+                other.handle_http_request if other is not None else None)
+        if self._server_acquired:
+            self.http_client.release(self.serverMode)
+            self._server_acquired = False
+
+        self.control.stop()
+        self.frames.stop()
         self.hass.async_create_task(self.async_disconnect())
 
         _LOGGER.info("ReCamera resources cleaned up")
@@ -0,0 +1,168 @@
+"""Reconnect scheduling shared by all device WebSocket clients."""
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import random
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import HomeAssistant, callback
+from .metrics import WS_RECONNECT_ATTEMPTS, WS_RECONNECT_WAITING
+
+_LOGGER = logging.getLogger(__name__)
+
+INITIAL_DELAY = 1.0  # Seconds before the first retry
+MAX_DELAY = 300.0  # Upper bound of the retry interval
+BACKOFF_FACTOR = 2.0
+JITTER = 0.2  # Fraction of the delay randomized to spread out retries
+WORKERS = 4  # Connection attempts allowed to run at the same time
+# Failed attempts after which the delay stops growing
+MAX_BACKOFF_STEPS = math.ceil(math.log(MAX_DELAY / INITIAL_DELAY, BACKOFF_FACTOR))
+
+
+class ReconnectScheduler:
+    """Retry disconnected WebSocket clients with exponential backoff.
+
+    One timer coroutine keeps a heap of due times for every waiting client
+    and hands due clients to a fixed pool of workers, so no task is created
+    per attempt. A reachability hint (zeroconf announcement, request from
+    the device) resets the backoff of a client and retries it right away.
+    """
+
+    _instance = None
+
+    def __new__(cls, hass: HomeAssistant):
+        if cls._instance is None:
+            cls._instance = super(ReconnectScheduler, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, hass: HomeAssistant):
+        if self._initialized:
+            return
+        self.hass = hass
+        self._heap = []  # (due, seq, client), stale entries are skipped
+        self._due = {}  # client -> due time of its pending attempt
+        self._attempts = {}  # client -> failed attempts since the last success
+        self._seq = itertools.count()
+        self._queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        WS_RECONNECT_WAITING.set_function(lambda: len(self._due))
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, self._async_stop)
+        self._initialized = True
+
+    def delay(self, client) -> float:
+        """Return the backoff delay before the next attempt of a client."""
+        attempts = min(self._attempts.get(client, 0), MAX_BACKOFF_STEPS)
+        delay = min(MAX_DELAY, INITIAL_DELAY * BACKOFF_FACTOR ** attempts)
+        return delay * random.uniform(1 - JITTER, 1 + JITTER)
+
+    @callback
+    def schedule(self, client, delay: float | None = None):
+        """Schedule a connection attempt.
+
+        Args:
+            client: WSClient to connect
+            delay: Seconds to wait, the backoff delay if None
+        """
+        if delay is None:
+            delay = self.delay(client)
+        due = self.hass.loop.time() + delay
+        self._due[client] = due
+        heapq.heappush(self._heap, (due, next(self._seq), client))
+        self._start()
+        self._wakeup.set()
+
+    @callback
+    def cancel(self, client):
+        """Stop retrying a client."""
+        self._due.pop(client, None)
+        self._attempts.pop(client, None)
+
+    @callback
+    def hint(self, client):
+        """Retry a waiting client now, the device is likely reachable."""
+        if client not in self._due:
+            return
+        _LOGGER.debug("Device %s is reachable, reconnecting now", client.device_id)
+        self._attempts.pop(client, None)
+        self.schedule(client, 0)
+
+    @callback
+    def hint_host(self, host: str):
+        """Retry the waiting clients of a host."""
+        for client in list(self._due):
+            if client.device_host == host:
+                self.hint(client)
+
+    def _start(self):
+        if self._tasks:
+            return
+        self._tasks.append(self.hass.async_create_background_task(
+            self._timer(), "sensecraft reconnect timer"))
+        for index in range(WORKERS):
+            self._tasks.append(self.hass.async_create_background_task(
+                self._worker(), f"sensecraft reconnect #{index}"))
+
+    async def _timer(self):
+        """Hand clients to the workers when they are due."""
+        loop = self.hass.loop
+        while True:
+            now = loop.time()
+            while self._heap:
+                due, _, client = self._heap[0]
+                if self._due.get(client) != due:
+                    heapq.heappop(self._heap)  # Rescheduled or cancelled
+                elif due <= now:
+                    heapq.heappop(self._heap)
+                    del self._due[client]
+                    self._queue.put_nowait(client)
+                else:
+                    break
+
+            self._wakeup.clear()
+            handle = loop.call_at(self._heap[0][0], self._wakeup.set) if self._heap else None
+            try:
+                await self._wakeup.wait()
+            finally:
+                if handle is not None:
+                    handle.cancel()
+
+    async def _worker(self):
+        """Run connection attempts handed over by the timer."""
+        while True:
+            client = await self._queue.get()
+            if not client.running or client.is_connected:
+                continue
+            try:
+                await self._attempt(client)
+            except Exception as e:
+                # Keep the worker alive and the client scheduled
+                _LOGGER.error("Error reconnecting to device %s: %s", client.device_id, e)
+                if client.running and client not in self._due:
+                    self.schedule(client, MAX_DELAY)
+
+    async def _attempt(self, client):
+        """Connect a client once and schedule the next attempt on failure."""
+        connected = await client.async_connect()
+        WS_RECONNECT_ATTEMPTS.labels("success" if connected else "failure").inc()
+        if connected:
+            self._attempts.pop(client, None)
+            return
+        if not client.running or client in self._due:
+            # Stopped, or hinted while the attempt was running
+            return
+        attempts = self._attempts[client] = self._attempts.get(client, 0) + 1
+        delay = self.delay(client)
+        log = _LOGGER.warning if attempts == 1 else _LOGGER.debug
+        log("Failed to connect to device %s, retrying in %.0f seconds",
+            client.device_id, delay)
+        self.schedule(client, delay)
+
+    async def _async_stop(self, event):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._due.clear()
+        self._heap.clear()
@@ -0,0 +1,120 @@
+"""Push-based MJPEG streaming of camera frames."""
+import asyncio
+import logging
+from aiohttp import web
+from homeassistant.core import callback
+from .metrics import CAMERA_STREAM_VIEWERS
+
+_LOGGER = logging.getLogger(__name__)
+
+BOUNDARY = "frameboundary"
+CONTENT_TYPE = f"multipart/x-mixed-replace;boundary={BOUNDARY}"
+
+
+class FrameBroadcast:
+    """Fan out the newest frame of a camera to all stream viewers.
+
+    Each frame is wrapped in its multipart part once, the first time a
+    viewer asks for it, and every viewer writes that same buffer. Frames
+    are either published as bytes or, with a source, fetched from it only
+    when a viewer is connected. Viewers
+    wait on one shared future that is resolved when the next frame is
+    published. A viewer still writing an older frame simply picks up the
+    newest one when it is done, so a slow client drops frames without
+    holding back the others.
+    """
+
+    def __init__(self, camera_id: str, source=None):
+        """Initialize the broadcast.
+
+        Args:
+            camera_id: Camera the frames belong to, used for metrics
+            source: Coroutine function returning the newest frame, called
+                when publish() is given no frame
+        """
+        self._source = source
+        self.seq = 0
+        self.viewers = 0
+        self.closed = False
+        self._frame = None
+        self._part = None
+        self._part_seq = 0
+        self._next = None  # Future resolved by the next publish
+        self._viewers_metric = CAMERA_STREAM_VIEWERS.labels(camera_id)
+
+    @callback
+    def publish(self, frame=None):
+        """Publish a frame, bytes or memoryview of a JPEG image.
+
+        Without a frame the new frame is fetched from the source on demand.
+        """
+        self._frame = frame
+        self.seq += 1
+        self._wake()
+
+    @callback
+    def close(self):
+        """End all streams, e.g. when the entity is removed."""
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        waiter, self._next = self._next, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def _async_part(self, seq: int) -> bytes | None:
+        if self._part_seq != seq:
+            frame = self._frame
+            if frame is None and self._source is not None:
+                frame = await self._source()
+            if frame is None:
+                return None
+            part = b"".join((
+                f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                f"Content-Length: {len(frame)}\r\n\r\n".encode(),
+                frame,
+                b"\r\n",
+            ))
+            if seq >= self._part_seq:
+                self._part, self._part_seq = part, seq
+            return part
+        return self._part
+
+    async def _async_next(self, seen: int):
+        """Wait for a frame newer than seen, return its sequence and part."""
+        while self.seq == seen:
+            if self.closed:
+                return None
+            if self._next is None:
+                self._next = asyncio.get_running_loop().create_future()
+            # Shielded: a viewer going away must not cancel the shared future
+            await asyncio.shield(self._next)
+        if self.closed:
+            return None
+        seq = self.seq
+        return seq, await self._async_part(seq)
+
+    async def async_stream(self, request: web.Request) -> web.StreamResponse:
+        """Serve frames to one client as an MJPEG stream."""
+        response = web.StreamResponse()
+        response.content_type = CONTENT_TYPE
+        await response.prepare(request)
+
+        self.viewers += 1
+        self._viewers_metric.inc()
+        seen = 0
+        try:
+            while True:
+                item = await self._async_next(seen)
+                if item is None:
+                    break
+                seen, part = item
+                if part is not None:
+                    await response.write(part)
+        except ConnectionResetError:
+            pass
+        finally:
+            self.viewers -= 1
+            self._viewers_metric.dec()
+        return response
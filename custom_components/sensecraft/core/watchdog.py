@@ -0,0 +1,108 @@
+"""Stall detection for device frame streams."""
+import logging
+from homeassistant.core import HomeAssistant, callback
+from .metrics import WS_STALLS, WS_STALL_RECOVERY
+
+_LOGGER = logging.getLogger(__name__)
+
+MIN_STALL = 2.0  # Never declare a stall sooner than this many seconds
+STARTUP_STALL = 15.0  # Allowed wait for frames before the cadence is known
+CHECK_INTERVAL = 1.0
+EWMA_ALPHA = 0.1  # Weight of the newest frame interval
+
+
+class StallWatchdog:
+    """Detect a frame stream that stopped delivering frames.
+
+    The expected frame interval is learned as an exponentially weighted
+    moving average. When no frame arrives for ``multiplier`` times that
+    interval the stall callback is called, typically to drop the
+    connection and reconnect. The time until the next frame is reported
+    as the time to recover.
+    """
+
+    def __init__(self, hass: HomeAssistant, device_id: str, multiplier: float, on_stall):
+        """Initialize the watchdog.
+
+        Args:
+            hass: Home Assistant instance
+            device_id: Device the stream comes from
+            multiplier: Stall threshold in frame intervals, 0 disables the watchdog
+            on_stall: Callback called on the event loop when the stream stalls
+        """
+        self.hass = hass
+        self.device_id = device_id
+        self.multiplier = multiplier
+        self._on_stall = on_stall
+        self.interval = None  # Learned frame interval, kept across reconnects
+        self.stalled_at = None
+        self._started = None
+        self._last_frame = None
+        self._handle = None
+        self._stalls = WS_STALLS.labels(device_id)
+        self._recovery = WS_STALL_RECOVERY.labels(device_id)
+
+    @property
+    def threshold(self) -> float:
+        """Return the seconds without frames that count as a stall."""
+        if self.interval is None:
+            return STARTUP_STALL
+        return max(MIN_STALL, self.multiplier * self.interval)
+
+    @callback
+    def start(self):
+        """Start watching a new connection."""
+        self.stop()
+        if self.multiplier <= 0:
+            return
+        self._started = self.hass.loop.time()
+        self._arm()
+
+    @callback
+    def stop(self):
+        """Stop watching, e.g. when the connection is closed."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._started = None
+        self._last_frame = None
+
+    @callback
+    def frame(self):
+        """Record a frame received on the stream."""
+        now = self.hass.loop.time()
+        if self._last_frame is not None:
+            elapsed = now - self._last_frame
+            if self.interval is None:
+                self.interval = elapsed
+            else:
+                self.interval += EWMA_ALPHA * (elapsed - self.interval)
+        self._last_frame = now
+        if self.stalled_at is not None:
+            recovery = now - self.stalled_at
+            self.stalled_at = None
+            self._recovery.observe(recovery)
+            _LOGGER.info("Frames from device %s resumed after %.1f seconds",
+                         self.device_id, recovery)
+
+    def _arm(self):
+        self._handle = self.hass.loop.call_later(CHECK_INTERVAL, self._check)
+
+    @callback
+    def _check(self):
+        self._handle = None
+        if self._started is None:
+            return
+        now = self.hass.loop.time()
+        last = self._last_frame if self._last_frame is not None else self._started
+        if now - last <= self.threshold:
+            self._arm()
+            return
+
+        _LOGGER.warning("No frames from device %s for %.1f seconds, reconnecting",
+                        self.device_id, now - last)
+        self._stalls.inc()
+        if self.stalled_at is None:
+            self.stalled_at = now
+        self.stop()
+        self._on_stall()
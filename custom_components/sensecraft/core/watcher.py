@@ -1,17 +1,80 @@
 """Watcher platform for Sensecraft."""
+import json
 import logging
-import os
-import aiofiles
-from base64 import b64decode
-from datetime import datetime, timedelta
-from homeassistant.core import HomeAssistant
+import time
+from collections import deque
+from datetime import datetime
+from functools import partial
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_call_later
 from .http_client import HTTPClient
-from ..const import DOMAIN
+from .image_pipeline import async_process_image
+from .image_store import ImageStore
+from .metrics import UNKNOWN_DEVICE, DeviceMetrics
+from ..const import (
+    DOMAIN,
+    SERVER_MODE_STANDALONE,
+    IMAGE_FORMAT_ORIGINAL,
+    DEFAULT_IMAGE_QUALITY,
+    DEFAULT_MAX_IMAGES,
+    DEFAULT_RETENTION_DAYS,
+    ALARM_IMAGES_ALL,
+    ALARM_IMAGES_FIRST_LAST,
+    DEFAULT_INGEST_WORKERS,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+RECENT_IMAGES = 8
+MEGABYTE = 1024 * 1024
+READINGS = "readings"
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl")
+# Notifications from a device that is not set up
+_UNKNOWN_METRICS = DeviceMetrics(HTTPClient.WATCHER_STATE_PATH, UNKNOWN_DEVICE)
+
+
+def watcher_readings_signal(eui) -> str:
+    """Return the dispatcher signal carrying the sensor readings of a device."""
+    return f"{DOMAIN}_watcher_{eui}_readings"
+
+
+class AlarmWindow:
+    """Repeats of one alarm text folded into a single event."""
+
+    __slots__ = ("text", "first", "last", "count", "timer", "last_event", "last_image")
+
+    def __init__(self, text: str, ts: float):
+        self.text = text
+        self.first = ts
+        self.last = ts
+        self.count = 1
+        self.timer = None
+        # Image event of the latest repeat, published when the window closes
+        self.last_event = None
+        # (image, time) of the latest repeat when only first and last are kept
+        self.last_image = None
+
+    def cancel(self):
+        """Cancel the close timer."""
+        if self.timer is not None:
+            self.timer()
+            self.timer = None
+
+    def as_event(self) -> dict:
+        """Return the alarm event data summarizing the window."""
+        return {
+            "text": self.text,
+            "count": self.count,
+            "first_seen": datetime.fromtimestamp(self.first).astimezone().isoformat(),
+            "last_seen": datetime.fromtimestamp(self.last).astimezone().isoformat(),
+        }
+
 
 class Watcher():
+    # All Watchers by EUI, the notification route is shared by them
+    _devices = {}
+
     def __init__(self, hass: HomeAssistant, config: dict):
         """Initialize the Watcher instance.
 
@@ -21,152 +84,325 @@ class Watcher():
         """
         self.hass = hass
         self.deviceId = config.get('device_id')
+        self.serverMode = config.get('server_mode', SERVER_MODE_STANDALONE)
         self.connected = False
 
         # Image retention settings
-        self.max_images = 10000  # Maximum number of images to keep
-        self.retention_days = 30  # Number of days to keep images
+        self.max_images = int(config.get('max_images', DEFAULT_MAX_IMAGES))
+        self.retention_days = int(config.get('retention_days', DEFAULT_RETENTION_DAYS))
+        # Storage quotas in MB, 0 means unlimited
+        self.storage_quota = int(config.get('storage_quota', 0))
+        self.storage_quota_total = int(config.get('storage_quota_total', 0))
         self.image_dir = self.hass.config.path('www/images')
+        self.image_store = ImageStore(hass, self.image_dir)
+        self.image_format = config.get('image_format', IMAGE_FORMAT_ORIGINAL)
+        self.image_quality = int(config.get('image_quality', DEFAULT_IMAGE_QUALITY))
+        self.dedup_perceptual = bool(config.get('dedup_perceptual', False))
+        # (dhash, digest, blob) of recent images for near-duplicate detection
+        self._recent_images = deque(maxlen=RECENT_IMAGES)
+
+        # Repeated identical alarms within this many seconds are folded, 0 disables
+        self.alarm_window = int(config.get('alarm_window', 0))
+        self.alarm_images = config.get('alarm_images', ALARM_IMAGES_ALL)
+        self._alarm_windows = {}
+        # Notification handlers running at once, applies to the shared route
+        self.ingest_workers = int(config.get('ingest_workers', DEFAULT_INGEST_WORKERS))
 
         # Initialize HTTP client
         self.http_client = HTTPClient(hass)
         self.http_client.handlers[HTTPClient.WATCHER_STATE_PATH] = self.handle_http_request
+        Watcher._devices[self.deviceId] = self
+        self._metrics = DeviceMetrics(HTTPClient.WATCHER_STATE_PATH, self.deviceId)
+        self._server_acquired = False
         _LOGGER.info("Watcher initialized with device ID: %s", self.deviceId)
 
-    async def cleanup_old_images(self):
-        """Clean up old images based on retention policy."""
-        try:
-            if not os.path.exists(self.image_dir):
-                return
-
-            # Calculate cutoff time for retention period
-            cutoff_time = datetime.now() - timedelta(days=self.retention_days)
-
-            # Get list of image files
-            files_to_remove = []
-            valid_files = []
-
-            # List directory contents
-            dir_contents = await self.hass.async_add_executor_job(os.listdir, self.image_dir)
-
-            # First pass: identify expired files and collect valid files
-            for f in dir_contents:
-                if f.startswith('watcher_') and f.endswith('.png'):
-                    full_path = os.path.join(self.image_dir, f)
-                    # Get file modification time
-                    mtime = os.path.getmtime(full_path)
-                    file_time = datetime.fromtimestamp(mtime)
-
-                    if file_time < cutoff_time:
-                        # File is older than retention period
-                        files_to_remove.append(full_path)
-                        _LOGGER.debug("Marked for removal (expired): %s (age: %s)",
-                                      full_path, file_time)
-                    else:
-                        # File is within retention period
-                        valid_files.append((full_path, mtime))
-
-            _LOGGER.debug("Total image files: %d, Valid files: %d, Expired files: %d",
-                          len(dir_contents), len(valid_files), len(files_to_remove))
-
-            # Sort valid files by modification time (oldest first)
-            valid_files.sort(key=lambda x: x[1])
-
-            # If we have more valid files than max_images, remove the oldest ones
-            if len(valid_files) > self.max_images:
-                # Calculate how many more files to remove
-                excess_count = len(valid_files) - self.max_images
-
-                # Add the oldest files to the removal list
-                for i in range(excess_count):
-                    file_path = valid_files[i][0]
-                    files_to_remove.append(file_path)
-                    _LOGGER.debug("Marked for removal (excess): %s", file_path)
-
-            # Now remove all marked files
-            for file_path in files_to_remove:
-                try:
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                        _LOGGER.debug("Removed image: %s", file_path)
-                    else:
-                        _LOGGER.debug("File already removed: %s", file_path)
-                except Exception as e:
-                    _LOGGER.error("Error removing file %s: %s", file_path, e)
+    async def async_setup(self) -> bool:
+        """Start receiving notifications for async_setup_entry initialization.
 
-        except Exception as e:
-            _LOGGER.error("Error cleaning up old images: %s", e)
+        Returns:
+            bool: True if setup successful
+        """
+        self.http_client.configure_route(HTTPClient.WATCHER_STATE_PATH, self.ingest_workers)
+        if not self._server_acquired:
+            self.http_client.acquire(self.serverMode)
+            self._server_acquired = True
+        self.image_store.configure(
+            self.deviceId, self.max_images, self.retention_days,
+            self.storage_quota * MEGABYTE, self.storage_quota_total * MEGABYTE)
+        self.image_store.async_load()
+        return True
+
+    async def save_image_to_file(self, image_base64, base_path):
+        """Save base64 image and its thumbnail.
+
+        Args:
+            image_base64: Base64 encoded image
+            base_path: Target path without extension
 
-    async def save_image_to_file(self, image_base64, filename):
-        """Save base64 image to file."""
+        Returns:
+            ProcessedImage: Stored image, or None if saving failed
+        """
         try:
-            image_data = b64decode(image_base64)
-            os.makedirs(os.path.dirname(filename), exist_ok=True)
-            async with aiofiles.open(filename, 'wb') as file:
-                await file.write(image_data)
-            return True
+            stored = await async_process_image(
+                self.hass, image_base64, base_path, self.image_store.blob_dir,
+                self.image_format, self.image_quality, self.dedup_perceptual,
+                self._recent_images)
         except Exception as e:
-            _LOGGER.error("Failed to save image to file %s: %s", filename, e)
-            return False
+            _LOGGER.error("Failed to save image to file %s: %s", base_path, e)
+            return None
+        if stored.thumbnail_data is not None:
+            self.image_store.cache.put(
+                stored.thumbnail, stored.thumbnail_mtime, stored.thumbnail_data)
+        if stored.duplicate:
+            _LOGGER.debug("Image %s reuses stored blob %s", stored.path, stored.digest)
+        elif stored.dhash is not None:
+            self._recent_images.append((stored.dhash, stored.digest, stored.blob))
+        return stored
 
     async def handle_http_request(self, request):
         """Handle incoming HTTP request for Watcher."""
+        started = time.monotonic()
+        result, devices = await self._handle_http_request(request)
+
+        # Counted for the devices in the payload, whichever owns the route.
+        # A batch counts as one request per run of notifications of a device.
+        duration = time.monotonic() - started
+        results = result['results'] if 'results' in result else (result,)
+        previous = None
+        for device, item in zip(devices, results):
+            metrics = device._metrics if device is not None else _UNKNOWN_METRICS
+            if metrics is not previous:
+                metrics.requests.inc()
+                metrics.duration.observe(duration)
+                previous = metrics
+            if item:
+                metrics.errors.inc()
+        return result
+
+    async def _read_notifications(self, request) -> tuple:
+        """Parse the notifications of a request.
+
+        A request carries one notification object, a JSON array of them, or
+        one per line with an NDJSON content type.
+
+        Returns:
+            tuple: List of notifications and whether the request was batched
+        """
+        if request.content_type in NDJSON_CONTENT_TYPES:
+            text = await request.text()
+            return [json.loads(line) for line in text.splitlines() if line.strip()], True
+        data = await request.json()
+        if isinstance(data, list):
+            return data, True
+        return [data], False
+
+    async def _handle_http_request(self, request):
+        """Process the Watcher notifications of a request.
+
+        All notifications are stored first, then the latest state of each
+        device is published once.
+
+        Returns:
+            tuple: Response data and the Watcher of each notification, None
+            for devices that are not set up
+        """
         try:
-            data = await request.json()
-            eui = data.get('deviceEui')
-            events = data.get('events')
+            notifications, batched = await self._read_notifications(request)
+        except Exception as e:
+            _LOGGER.error("Error reading Watcher request: %s", e)
+            return {
+                'code': 11999,
+                'msg': str(e),
+                'data': {}
+            }, (None,)
+
+        pending = {}
+        results = []
+        devices = []
+        for notification in notifications:
+            eui = notification.get('deviceEui') if isinstance(notification, dict) else None
+            devices.append(self._devices.get(eui) if isinstance(eui, str) else None)
+            results.append(await self._handle_notification(notification, pending))
+        self._flush_state(pending)
+
+        if not batched:
+            return results[0], devices
+        return {'results': results}, devices
+
+    async def _handle_notification(self, notification, pending: dict) -> dict:
+        """Store one notification and record the state it updates.
+
+        Args:
+            notification: Notification object sent by the device
+            pending: Latest state per device, published by _flush_state
+
+        Returns:
+            dict: Empty on success, otherwise the error code and message
+        """
+        try:
+            eui = notification.get('deviceEui')
+            events = notification.get('events')
             if eui is None or events is None:
                 return {
                     'code': 11200,
                     'msg': "Invalid parameters",
                     'data': {}
                 }
-
-            # Handle text events
-            if text := events.get('text'):
-                self.hass.bus.fire(
-                    f"{DOMAIN}_watcher_{eui}_alarm", {"text": text})
+            # Alarm and image settings are those of the device that sent it,
+            # the route is owned by whichever Watcher was set up last
+            device = self._devices.get(eui, self)
+            state = pending.setdefault(eui, {})
+            now = datetime.now()
+
+            # Handle text events, repeats of an open alarm are folded into it
+            text = events.get('text')
+            window = device._coalesce_alarm(eui, text, now.timestamp()) if text else None
+            if window is None and text:
+                opened = device._alarm_windows.get(eui)
+                state['alarm'] = opened.as_event() if opened is not None else {"text": text}
 
             # Handle image events
-            if image := events.get('img'):
-                # Schedule cleanup as a background task instead of awaiting it
-                self.hass.create_task(self.cleanup_old_images())
-
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-                filename = os.path.join(
-                    self.image_dir, f'watcher_{timestamp}.png')
-                if await self.save_image_to_file(image, filename):
-                    self.hass.bus.fire(f"{DOMAIN}_watcher_{eui}_image", {
-                        "image_path": filename,
-                        "alarm_text": text if text is not None else ""
-                    })
+            image = events.get('img')
+            if image and window is not None and device.alarm_images == ALARM_IMAGES_FIRST_LAST:
+                # 只保留最后一张, 窗口结束时保存
+                window.last_image = (image, now)
+            elif image:
+                stored = await device._store_image(eui, image, text, now)
+                if stored is None:
+                    return {
+                        'code': 11500,
+                        'msg': "Failed to save image",
+                        'data': {}
+                    }
+                image_event = {
+                    "image_path": stored.path,
+                    "thumbnail_path": stored.thumbnail,
+                    "alarm_text": text if text is not None else ""
+                }
+                if window is not None:
+                    window.last_event = image_event
                 else:
-                    _LOGGER.error("Failed to save image for device %s", eui)
+                    state['image'] = image_event
 
-            # Handle sensor data
+            # Handle sensor data, readings the device did not send are left as they are
             if sensor_data := events.get('data', {}).get('sensor', {}):
+                readings = state.setdefault(READINGS, {})
                 for sensor_type in ['temperature', 'humidity', 'CO2']:
-                    value = sensor_data.get(sensor_type, 'unavailable')
-                    self.hass.bus.fire(
-                        f"{DOMAIN}_watcher_{eui}_{sensor_type.lower()}", {"value": value})
+                    if (value := sensor_data.get(sensor_type)) is not None:
+                        readings[sensor_type.lower()] = value
 
             return {}  # Return empty data on success
 
         except Exception as e:
-            _LOGGER.error("Error handling Watcher request: %s", e)
+            _LOGGER.error("Error handling Watcher notification: %s", e)
             return {
                 'code': 11999,
                 'msg': str(e),
                 'data': {}
             }
 
+    async def _store_image(self, eui, image, text, now: datetime):
+        """Save, index and add an image to retention.
+
+        Returns:
+            ProcessedImage: Stored image, or None if saving failed
+        """
+        timestamp = now.strftime('%Y%m%d_%H%M%S_%f')
+        base_path = self.image_store.image_path(
+            eui, now.timestamp(), f'watcher_{timestamp}')
+        stored = await self.save_image_to_file(image, base_path)
+        if stored is None:
+            _LOGGER.error("Failed to save image for device %s", eui)
+            return None
+        self.image_store.add(stored.path, eui, now.timestamp(), stored.size,
+                             stored.digest, stored.blob, text or "")
+        return stored
+
+    def _coalesce_alarm(self, eui, text: str, ts: float):
+        """Fold an alarm into the open window of the device.
+
+        Returns:
+            AlarmWindow: The window the alarm was folded into, or None if the
+            alarm starts a new window and must be published
+        """
+        if not self.alarm_window:
+            return None
+        window = self._alarm_windows.get(eui)
+        if window is not None and window.text == text:
+            window.count += 1
+            window.last = ts
+            window.cancel()
+            window.timer = async_call_later(
+                self.hass, self.alarm_window, partial(self._close_alarm_window, eui))
+            return window
+
+        if window is not None:
+            self._close_alarm_window(eui)
+        window = self._alarm_windows[eui] = AlarmWindow(text, ts)
+        window.timer = async_call_later(
+            self.hass, self.alarm_window, partial(self._close_alarm_window, eui))
+        return None
+
+    @callback
+    def _close_alarm_window(self, eui, _now=None):
+        """Publish the summary of a window that saw repeated alarms."""
+        window = self._alarm_windows.pop(eui, None)
+        if window is None:
+            return
+        window.cancel()
+        if window.count == 1:
+            return
+        self.hass.bus.async_fire(f"{DOMAIN}_watcher_{eui}_alarm", window.as_event())
+        if window.last_image is not None:
+            self.hass.async_create_background_task(
+                self._async_store_last_image(eui, window),
+                f"sensecraft watcher {eui} alarm image")
+        elif window.last_event is not None:
+            self.hass.bus.async_fire(f"{DOMAIN}_watcher_{eui}_image", window.last_event)
+
+    async def _async_store_last_image(self, eui, window):
+        """Save the last image of a window whose other repeats were dropped."""
+        image, now = window.last_image
+        stored = await self._store_image(eui, image, window.text, now)
+        if stored is not None:
+            self.hass.bus.async_fire(f"{DOMAIN}_watcher_{eui}_image", {
+                "image_path": stored.path,
+                "thumbnail_path": stored.thumbnail,
+                "alarm_text": window.text
+            })
+
+    def _flush_state(self, pending: dict):
+        """Publish the latest alarm, image and sensor values of each device.
+
+        All sensor readings of a device go to its entities in one dispatcher
+        call, so every changed state is written in the same loop iteration.
+        """
+        for eui, state in pending.items():
+            if readings := state.pop(READINGS, None):
+                async_dispatcher_send(self.hass, watcher_readings_signal(eui), readings)
+            for event_type, data in state.items():
+                self.hass.bus.async_fire(f"{DOMAIN}_watcher_{eui}_{event_type}", data)
+
     def to_config(self):
         """Convert current configuration to dictionary format.
 
         Returns:
             dict: Current device configuration
         """
-        return {'device_id': self.deviceId}
+        return {
+            'device_id': self.deviceId,
+            'server_mode': self.serverMode,
+            'image_format': self.image_format,
+            'image_quality': self.image_quality,
+            'dedup_perceptual': self.dedup_perceptual,
+            'max_images': self.max_images,
+            'retention_days': self.retention_days,
+            'storage_quota': self.storage_quota,
+            'storage_quota_total': self.storage_quota_total,
+            'alarm_window': self.alarm_window,
+            'alarm_images': self.alarm_images,
+            'ingest_workers': self.ingest_workers,
+        }
 
     @staticmethod
     def from_config(hass: HomeAssistant, config: dict):
@@ -183,7 +419,17 @@ class Watcher():
 
     def cleanup(self):
         """Clean up all resources and unregister handlers."""
-        # Remove handler
+        for eui in list(self._alarm_windows):
+            self._close_alarm_window(eui)
+        if Watcher._devices.get(self.deviceId) is self:
+            del Watcher._devices[self.deviceId]
+        # Remove handler, or hand the shared route over to a Watcher still set up
         if self.http_client.handlers[HTTPClient.WATCHER_STATE_PATH] == self.handle_http_request:
-            self.http_client.handlers[HTTPClient.WATCHER_STATE_PATH] = None
+            other = next(iter(Watcher._devices.values()), None)
+            self.http_client.handlers[HTTPClient.WATCHER_STATE_PATH] = (
+                other.handle_http_request if other is not None else None)
+        if self._server_acquired:
+            self.http_client.release(self.serverMode)
+            self._server_acquired = False
+        self.image_store.release(self.deviceId)
         _LOGGER.info("Watcher resources cleaned up")
@@ -2,17 +2,27 @@
 import json
 import logging
 import asyncio
+import weakref
 from aiohttp import WSMsgType
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from .metrics import WS_CLIENTS
+from .reconnect import ReconnectScheduler
+from .watchdog import StallWatchdog
+from ..const import DEFAULT_STALL_MULTIPLIER
 
 _LOGGER = logging.getLogger(__name__)
 
+PROTOCOL_VERSION = 1
+
 
 class WSClient:
     """WebSocket client for a single device connection."""
 
-    def __init__(self, hass: HomeAssistant, device_id: str, device_host: str):
+    _instances = weakref.WeakSet()
+
+    def __init__(self, hass: HomeAssistant, device_id: str, device_host: str,
+                 stall_multiplier: float = DEFAULT_STALL_MULTIPLIER):
         """Initialize the WebSocket client for a specific device."""
         self.hass = hass
         self.device_id = device_id
@@ -22,6 +32,19 @@ class WSClient:
         self._task = None
         self._message_callback = None
         self._state_callback = None
+        # Control protocol: JSON text messages correlated by request id
+        self._text_callback = None
+        self._pending = {}
+        self._next_id = 0
+        self.protocol_supported = None  # Unknown until negotiated
+        self.running = False  # Reconnect when the connection is lost
+        self.watchdog = StallWatchdog(hass, device_id, stall_multiplier, self._handle_stall)
+        WSClient._instances.add(self)
+
+    @staticmethod
+    def open_connections() -> int:
+        """Return the number of connected clients."""
+        return sum(1 for client in list(WSClient._instances) if client.is_connected)
 
     @property
     def is_connected(self) -> bool:
@@ -45,7 +68,7 @@ class WSClient:
         try:
             # Ensure cleanup of any existing connection
             if self._client:
-                await self.async_disconnect()
+                await self._async_close()
                 
             session = async_get_clientsession(self.hass)
             self._client = await session.ws_connect(
@@ -60,12 +83,14 @@ class WSClient:
 
             # Create message receiving task
             self._task = self.hass.async_create_task(self._receive_messages())
+            self.watchdog.start()
 
             if self._state_callback:
                 self._state_callback(True)
             return True
         except Exception as e:
-            _LOGGER.error("Failed to connect to WebSocket for device %s: %s", self.device_id, e)
+            # Retries are logged by the reconnect scheduler
+            _LOGGER.debug("Failed to connect to WebSocket for device %s: %s", self.device_id, e)
             if self._state_callback:
                 self._state_callback(False)
             return False
@@ -86,12 +111,15 @@ class WSClient:
                     msg = await self._client.receive(timeout=30)
                     
                     if msg.type == WSMsgType.BINARY:
+                        self.watchdog.frame()
                         try:
                             if self._message_callback:
                                 self._message_callback(msg.data)
                         except json.JSONDecodeError:
                             _LOGGER.error("Invalid JSON received from device %s: %s", 
                                         self.device_id, msg.data)
+                    elif msg.type == WSMsgType.TEXT:
+                        self._handle_text(msg.data)
                     elif msg.type in (WSMsgType.ERROR, WSMsgType.CLOSED, WSMsgType.CLOSING):
                         # Handle connection termination messages
                         if msg.type == WSMsgType.ERROR:
@@ -113,34 +141,135 @@ class WSClient:
             _LOGGER.error("Error in WebSocket receive loop for device %s: %s", 
                          self.device_id, e)
         finally:
-            await self.async_disconnect()
+            # Connection lost, unless closed from outside which already cleaned up
+            if self._task is asyncio.current_task():
+                await self._async_close()
+                if self.running:
+                    ReconnectScheduler(self.hass).schedule(self)
 
     async def async_disconnect(self):
+        """Close the WebSocket connection and stop reconnecting."""
+        self.running = False
+        ReconnectScheduler(self.hass).cancel(self)
+        await self._async_close()
+
+    async def _async_close(self):
         """Close the WebSocket connection and cleanup resources."""
-        if self._task:
-            self._task.cancel()
+        self.watchdog.stop()
+        task, self._task = self._task, None
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
             try:
-                await self._task
+                await task
             except asyncio.CancelledError:
                 pass
-            self._task = None
 
         if self._client and not self._client.closed:
             await self._client.close()
         self._client = None
+        self.protocol_supported = None
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("WebSocket disconnected"))
+        self._pending = {}
 
         if self._state_callback:
             self._state_callback(False)
 
+    def _handle_stall(self):
+        """Drop a connection that stopped sending frames and reconnect now."""
+        self.hass.async_create_task(self._async_restart())
+
+    async def _async_restart(self):
+        await self._async_close()
+        if self.running:
+            ReconnectScheduler(self.hass).schedule(self, 0)
+
+    def _handle_text(self, text: str):
+        """Route a control protocol message.
+
+        Responses resolve the request with the same id, everything else is
+        passed to the text callback.
+        """
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            _LOGGER.error("Invalid JSON received from device %s: %s", self.device_id, text)
+            return
+        if not isinstance(data, dict):
+            return
+        if data.get('type') == 'response':
+            future = self._pending.pop(data.get('id'), None)
+            if future is not None and not future.done():
+                future.set_result(data)
+            return
+        if self._text_callback:
+            try:
+                self._text_callback(data)
+            except Exception as e:
+                _LOGGER.error("Error handling message from device %s: %s", self.device_id, e)
+
+    async def request(self, payload: dict, timeout: float) -> dict:
+        """Send a control protocol request and wait for its response.
+
+        Args:
+            payload: Request message, the id is added here
+            timeout: Seconds to wait for the response
+
+        Returns:
+            dict: Response message
+
+        Raises:
+            ConnectionError: If the connection is not open or is lost
+            asyncio.TimeoutError: If the device does not respond in time
+        """
+        if not self.is_connected:
+            raise ConnectionError("WebSocket not connected")
+        self._next_id += 1
+        request_id = self._next_id
+        future = self.hass.loop.create_future()
+        self._pending[request_id] = future
+        try:
+            await self._client.send_str(json.dumps({**payload, 'id': request_id}))
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def async_negotiate(self, timeout: float) -> bool:
+        """Check whether the device firmware speaks the control protocol.
+
+        Returns:
+            bool: True if the device answered the hello request
+        """
+        try:
+            response = await self.request(
+                {'type': 'hello', 'protocol': PROTOCOL_VERSION}, timeout)
+            self.protocol_supported = 'error' not in response
+        except (asyncio.TimeoutError, ConnectionError):
+            self.protocol_supported = False
+        except Exception as e:
+            _LOGGER.error("Error negotiating protocol with device %s: %s", self.device_id, e)
+            self.protocol_supported = False
+        _LOGGER.info("WebSocket control protocol %s by device %s",
+                     "supported" if self.protocol_supported else "not supported",
+                     self.device_id)
+        return self.protocol_supported
+
     def start(self):
         """Start the WebSocket client and begin reconnection attempts."""
         if self.is_connected:
             _LOGGER.warning("WebSocket client for device %s is already connected", self.device_id)
             return
-            
-        self.hass.async_create_task(self._try_reconnect())
+
+        self.running = True
+        ReconnectScheduler(self.hass).schedule(self, 0)
         _LOGGER.info("WebSocket client started for device %s", self.device_id)
 
+    def hint(self):
+        """Retry now if waiting to reconnect, the device was seen on the network."""
+        if self.running and not self.is_connected:
+            ReconnectScheduler(self.hass).hint(self)
+
     async def async_cleanup(self):
         """Clean up all resources and callbacks asynchronously."""
         await self.async_disconnect()
@@ -148,6 +277,7 @@ class WSClient:
         # Clean up callbacks after disconnection
         self._message_callback = None
         self._state_callback = None
+        self._text_callback = None
         
         _LOGGER.info("WebSocket client resources cleaned up for device %s", self.device_id)
         
@@ -155,38 +285,5 @@ class WSClient:
         """Clean up all resources and callbacks (synchronous wrapper)."""
         self.hass.async_create_task(self.async_cleanup())
 
-    async def _try_reconnect(self):
-        """Attempt to reconnect to the device.
-        
-        If connection fails, wait 5 seconds before retrying.
-        Only attempts reconnection if not currently connected.
-        """
-        if self.is_connected:
-            _LOGGER.info("WebSocket client for device %s is already connected", self.device_id)
-            return
-
-        try:
-            _LOGGER.info("Attempting to reconnect to device %s", self.device_id)
-            connected = await self.async_connect()
-            
-            if connected:
-                _LOGGER.info("Successfully reconnected to device %s", self.device_id)
-                if self._state_callback:
-                    self._state_callback(True)
-                return
-                
-            _LOGGER.warning("Failed to reconnect to device %s", self.device_id)
-            if self._state_callback:
-                self._state_callback(False)
-                
-        except Exception as e:
-            _LOGGER.error("Error during reconnection attempt for device %s: %s", self.device_id, e)
-            if self._state_callback:
-                self._state_callback(False)
-                
-        # If not connected, wait and retry
-        if not self.is_connected:
-            _LOGGER.info("Will retry reconnection to device %s in 5 seconds", self.device_id)
-            await asyncio.sleep(5)
-            self.hass.async_create_task(self._try_reconnect())
 
+WS_CLIENTS.set_function(WSClient.open_connections)
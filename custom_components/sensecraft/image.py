@@ -1,5 +1,5 @@
 import logging
-import os
+import mimetypes
 from homeassistant import config_entries
 from homeassistant.util import dt as dt_util
 from homeassistant.core import HomeAssistant, callback
@@ -27,8 +27,7 @@ async def async_setup_entry(
 
     if data_source == WATCHER:
         watcher: Watcher = data[WATCHER]
-        deviceId = watcher.deviceId
-        entities = [WatcherImage(hass, deviceId)]
+        entities = [WatcherImage(hass, watcher)]
         async_add_entities(entities, update_before_add=False)
 
 
@@ -36,15 +35,16 @@ class WatcherImage(ImageEntity):
     def __init__(
         self,
         hass: HomeAssistant,
-        eui: str,
+        watcher: Watcher,
     ) -> None:
         """Initialize the camera entity."""
         self.hass = hass
         
         ImageEntity.__init__(self, hass)
         
-        self._eui = eui
-        self._deviceName = f"watcher_{eui}"
+        self._watcher = watcher
+        self._eui = watcher.deviceId
+        self._deviceName = f"watcher_{self._eui}"
         self._attr_unique_id = f"{self._deviceName}_image"
         self._event_type = f"{DOMAIN}_{self._attr_unique_id}"
         self._attr_name = f"{self._deviceName}_alarm_triggered"
@@ -67,13 +67,23 @@ class WatcherImage(ImageEntity):
     def handle_event(self, event):
         """Handle the event in a callback to ensure thread safety."""
         image_path = event.data.get('image_path')
+        thumbnail_path = event.data.get('thumbnail_path')
         alarm_text = event.data.get('alarm_text')
-        if image_path and os.path.exists(image_path):
-            self._image_path = image_path
-            image_url = f"http://<home-assistant-url>/local/images/{os.path.basename(image_path)}"
+        # 事件只在图片保存成功后触发, 不再检查文件
+        if image_path:
+            # 默认使用缩略图, 原图通过链接查看
+            self._image_path = thumbnail_path or image_path
+            self._attr_content_type = mimetypes.guess_type(
+                self._image_path)[0] or "image/jpeg"
+            store = self._watcher.image_store
+            image_url = f"http://<home-assistant-url>{store.image_url(image_path)}"
+            message = f'"{alarm_text}"  View image: {image_url}'
+            if thumbnail_path:
+                thumbnail_url = f"http://<home-assistant-url>{store.image_url(thumbnail_path)}"
+                message += f'  Thumbnail: {thumbnail_url}'
             self.hass.bus.fire('logbook_entry', {
                 'name': self._attr_name,
-                'message': f'"{alarm_text}"  View image: {image_url}',
+                'message': message,
                 'entity_id': self.entity_id
             })
         else:
@@ -95,10 +105,9 @@ class WatcherImage(ImageEntity):
             sw_version="1.0",
         )
     
-    def image(self) -> bytes | None:
-        """Return bytes of image."""
-        if self._image_path and os.path.exists(self._image_path):
-            with open(self._image_path, 'rb') as file:
-                return file.read()
-        return None
+    async def async_image(self) -> bytes | None:
+        """Return bytes of image from the shared image cache."""
+        if not self._image_path:
+            return None
+        return await self._watcher.image_store.cache.async_read(self._image_path)
     
\ No newline at end of file
@@ -0,0 +1,173 @@
+"""Media source for Watcher snapshots.
+
+Snapshots are browsed by device, day and event. Folders are listed from
+the event index one page at a time, so opening a day with thousands of
+images neither lists nor stats the image directories, and every event
+uses the thumbnail generated when the image was stored.
+"""
+from __future__ import annotations
+import mimetypes
+from datetime import datetime, timedelta
+
+from homeassistant.components.media_player import MediaClass, MediaType
+from homeassistant.components.media_source.error import Unresolvable
+from homeassistant.components.media_source.models import (
+    BrowseMediaSource,
+    MediaSource,
+    MediaSourceItem,
+    PlayMedia,
+)
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .core.image_store import ImageStore, thumbnail_path
+
+PAGE_SIZE = 100
+EVENT_PREFIX = "event/"
+
+
+async def async_get_media_source(hass: HomeAssistant) -> MediaSource:
+    """Set up the Watcher media source."""
+    return WatcherMediaSource(hass)
+
+
+class WatcherMediaSource(MediaSource):
+    """Provide Watcher snapshots as media."""
+
+    name = "SenseCraft Watcher"
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the media source."""
+        super().__init__(DOMAIN)
+        self.hass = hass
+        self.store = ImageStore(hass, hass.config.path('www/images'))
+
+    async def async_resolve_media(self, item: MediaSourceItem) -> PlayMedia:
+        """Resolve an event to the URL of its image."""
+        row = await self._async_get_event(item.identifier)
+        path = row[4]
+        return PlayMedia(self.store.image_url(path), _mime_type(path))
+
+    async def async_browse_media(self, item: MediaSourceItem) -> BrowseMediaSource:
+        """Return a device, day or page of events."""
+        identifier = item.identifier or ""
+        if not identifier:
+            return await self._async_browse_root()
+        if identifier.startswith(EVENT_PREFIX):
+            return self._event(await self._async_get_event(identifier))
+
+        parts = identifier.split("/", 2)
+        if len(parts) == 1:
+            return await self._async_browse_device(parts[0])
+        return await self._async_browse_day(
+            parts[0], parts[1], parts[2] if len(parts) > 2 else None)
+
+    async def _async_get_event(self, identifier: str | None):
+        """Return the index row of an event identifier."""
+        if not identifier or not identifier.startswith(EVENT_PREFIX):
+            raise Unresolvable(f"Unknown media item: {identifier}")
+        try:
+            event_id = int(identifier[len(EVENT_PREFIX):])
+        except ValueError as e:
+            raise Unresolvable(f"Unknown media item: {identifier}") from e
+        row = await self.store.index.async_get(event_id)
+        if row is None:
+            raise Unresolvable(f"Event {event_id} no longer exists")
+        return row
+
+    async def _async_browse_root(self) -> BrowseMediaSource:
+        devices = await self.store.index.async_devices()
+        return BrowseMediaSource(
+            domain=DOMAIN,
+            identifier="",
+            media_class=MediaClass.DIRECTORY,
+            media_content_type=MediaType.IMAGE,
+            title=self.name,
+            can_play=False,
+            can_expand=True,
+            children_media_class=MediaClass.DIRECTORY,
+            children=[
+                _folder(eui, f"watcher_{eui}")
+                for eui in devices
+            ],
+        )
+
+    async def _async_browse_device(self, eui: str) -> BrowseMediaSource:
+        days = await self.store.index.async_days(eui)
+        return BrowseMediaSource(
+            domain=DOMAIN,
+            identifier=eui,
+            media_class=MediaClass.DIRECTORY,
+            media_content_type=MediaType.IMAGE,
+            title=f"watcher_{eui}",
+            can_play=False,
+            can_expand=True,
+            children_media_class=MediaClass.DIRECTORY,
+            children=[
+                _folder(f"{eui}/{day}", f"{day} ({count})")
+                for day, count in days
+            ],
+        )
+
+    async def _async_browse_day(self, eui: str, day: str,
+                                cursor: str | None) -> BrowseMediaSource:
+        try:
+            start = datetime.strptime(day, "%Y-%m-%d")
+        except ValueError as e:
+            raise Unresolvable(f"Unknown day: {day}") from e
+        end = start + timedelta(days=1)
+        try:
+            rows, next_cursor = await self.store.index.async_query(
+                eui, start.timestamp(), end.timestamp(), PAGE_SIZE, cursor)
+        except ValueError as e:
+            raise Unresolvable(str(e)) from e
+
+        children = [self._event(row) for row in rows]
+        if next_cursor is not None:
+            # 下一页按需加载
+            children.append(_folder(f"{eui}/{day}/{next_cursor}", "More..."))
+        identifier = f"{eui}/{day}" + (f"/{cursor}" if cursor else "")
+        return BrowseMediaSource(
+            domain=DOMAIN,
+            identifier=identifier,
+            media_class=MediaClass.DIRECTORY,
+            media_content_type=MediaType.IMAGE,
+            title=day,
+            can_play=False,
+            can_expand=True,
+            children_media_class=MediaClass.IMAGE,
+            children=children,
+        )
+
+    def _event(self, row) -> BrowseMediaSource:
+        """Return the media item of an index row."""
+        event_id, _, ts, alarm, path, _, _ = row
+        title = datetime.fromtimestamp(ts).strftime("%H:%M:%S")
+        if alarm:
+            title += f" {alarm}"
+        return BrowseMediaSource(
+            domain=DOMAIN,
+            identifier=f"{EVENT_PREFIX}{event_id}",
+            media_class=MediaClass.IMAGE,
+            media_content_type=_mime_type(path),
+            title=title,
+            can_play=True,
+            can_expand=False,
+            thumbnail=self.store.image_url(thumbnail_path(path)),
+        )
+
+
+def _folder(identifier: str, title: str) -> BrowseMediaSource:
+    return BrowseMediaSource(
+        domain=DOMAIN,
+        identifier=identifier,
+        media_class=MediaClass.DIRECTORY,
+        media_content_type=MediaType.IMAGE,
+        title=title,
+        can_play=False,
+        can_expand=True,
+    )
+
+
+def _mime_type(path: str) -> str:
+    return mimetypes.guess_type(path)[0] or "image/jpeg"
@@ -1,9 +1,11 @@
 """Demo platform that offers a fake Number entity."""
 from __future__ import annotations
+from functools import partial
 from homeassistant.components.number import NumberEntity, NumberMode
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_call_later
 from homeassistant.helpers.device_registry import DeviceInfo
 from .core.grove_vision_ai import GroveVisionAI
 from .core.recamera import ReCamera
@@ -17,6 +19,9 @@ import logging
 
 _LOGGER = logging.getLogger(__name__)
 
+ANGLE_TOLERANCE = 1.0  # Degrees within which a reported angle reaches the target
+PENDING_TIMEOUT = 10  # Seconds to wait for the device to reach a target
+
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -181,6 +186,16 @@ class ReCameraMotor(NumberEntity):
         self._attr_native_value = 0.0
         self._attr_mode = NumberMode.SLIDER
         self.motor_id = motor_id
+        # Optimistic state: last angle the device reported or acked, None
+        # until it does, and the (token, target, fallback) of the command
+        # waiting to be confirmed. The fallback is the angle shown before
+        # the first unconfirmed command, used while nothing is confirmed.
+        self._confirmed = None
+        self._pending = None
+        self._token = 0
+        self._reported = False
+        self._acked = False
+        self._timeout = None
 
     @property
     def available(self) -> bool:
@@ -192,11 +207,9 @@ class ReCameraMotor(NumberEntity):
         self._event = self.hass.bus.async_listen(
             self._event_type, self._handle_state_event)
         
-        # 添加连接状态事件监听
-        self._connection_event = self.hass.bus.async_listen(
-            f"sensecraft_recamera_{self._recamera.deviceId}_connection_state",
-            self._handle_connection_state
-        )
+        # 连接状态由 ReCamera 统一维护
+        self._connection_event = self._recamera.availability.async_add_listener(
+            self.async_write_ha_state)
 
     async def async_will_remove_from_hass(self) -> None:
         """Entity being removed from hass."""
@@ -207,11 +220,8 @@ class ReCameraMotor(NumberEntity):
         if self._connection_event:
             self._connection_event()
             self._connection_event = None
-    
-    def _handle_connection_state(self, event):
-        """Handle connection state changes."""
-        self._recamera.connected = event.data.get("connected", False)
-        self.hass.loop.call_soon_threadsafe(self.async_schedule_update_ha_state)
+
+        self._clear_pending()
     
     async def _handle_state_event(self, event):
         """处理状态事件"""
@@ -219,13 +229,45 @@ class ReCameraMotor(NumberEntity):
             state_data = event.data.get("data", {})
             motor_id = state_data.get("motor_id")
             angle = state_data.get("angle")
-            if motor_id == self.motor_id:
-                self.update_state(angle)
+            if motor_id == self.motor_id and angle is not None:
+                self._reconcile(float(angle))
         except Exception as e:
             _LOGGER.error("Error handling state event: %s", e)
 
+    @callback
+    def _reconcile(self, angle: float) -> None:
+        """Apply an angle reported by the device.
+
+        While a command is pending the target stays displayed, positions
+        reported on the way there only update the confirmed angle.
+        """
+        self._confirmed = angle
+        if self._pending is not None:
+            self._reported = True
+            if abs(angle - self._pending[1]) > ANGLE_TOLERANCE:
+                return
+            self._clear_pending()
+        self.update_state(angle)
+
     async def async_set_native_value(self, value: float) -> None:
-        """Set the motor position."""
+        """Set the motor position.
+
+        The target is shown right away and rolled back to the last confirmed
+        angle if the command fails or the device does not get there in time.
+        """
+        self._token += 1
+        token = self._token
+        # A replaced target was never confirmed, keep the fallback from before it
+        fallback = self._attr_native_value if self._pending is None else self._pending[2]
+        self._clear_pending()
+        self._pending = (token, value, fallback)
+        self._reported = False
+        self._acked = False
+        self._timeout = async_call_later(
+            self.hass, PENDING_TIMEOUT, partial(self._async_pending_timeout, token))
+        self._attr_native_value = value
+        self.async_write_ha_state()
+
         try:
             # 构建控制命令
             command = {
@@ -237,15 +279,47 @@ class ReCameraMotor(NumberEntity):
             }
             # 发送控制命令
             result = await self._recamera.send_control(command)
-            if result and result.get('code') == 0:
-                self._attr_native_value = value
-                self.async_schedule_update_ha_state()
-            
         except Exception as e:
             _LOGGER.error("Error setting motor position: %s", e)
+            result = None
+
+        if self._pending is None or self._pending[0] != token:
+            # Already reconciled, or replaced by a newer target
+            return
+        if result and result.get('code') == 0:
+            self._acked = True
+        else:
+            _LOGGER.warning("Motor %s rejected angle %s, rolling back", self.motor_id, value)
+            self._rollback()
+
+    @callback
+    def _async_pending_timeout(self, token: int, _now) -> None:
+        """Settle a target the device did not confirm in time."""
+        if self._pending is None or self._pending[0] != token:
+            return
+        self._timeout = None
+        if self._acked and not self._reported:
+            # Firmware accepted the command but does not report angles
+            self._confirmed = self._pending[1]
+            self._clear_pending()
+            return
+        self._rollback()
+
+    @callback
+    def _rollback(self) -> None:
+        """Drop the pending target and show the last confirmed angle."""
+        angle = self._confirmed if self._confirmed is not None else self._pending[2]
+        self._clear_pending()
+        self.update_state(angle)
+
+    @callback
+    def _clear_pending(self) -> None:
+        self._pending = None
+        if self._timeout is not None:
+            self._timeout()
+            self._timeout = None
 
     def update_state(self, angle: float) -> None:
         """更新电机状态."""
         self._attr_native_value = angle
         self.hass.loop.call_soon_threadsafe(self.async_schedule_update_ha_state)
-
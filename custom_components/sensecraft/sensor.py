@@ -2,13 +2,14 @@
 from __future__ import annotations
 import logging
 from homeassistant import config_entries
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 
 from .core.cloud import Cloud, CloudSensorInfo
 from .core.grove_vision_ai import GroveVisionAI
-from .core.watcher import Watcher
+from .core.watcher import Watcher, watcher_readings_signal
 from homeassistant.const import (
     PERCENTAGE,
+    UnitOfInformation,
     UnitOfTemperature,
 )
 from homeassistant.helpers.device_registry import (
@@ -17,6 +18,7 @@ from homeassistant.helpers.device_registry import (
     async_get
 )
 from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity import Entity
 from .const import (
     MEASUREMENT_DICT,
@@ -103,6 +105,8 @@ async def async_setup_entry(
         alarm._attr_icon = "mdi:alarm-light"
         entities.append(alarm)
 
+        entities.append(WatcherStorageSensor(watcher))
+
         async_add_entities(entities, update_before_add=False)
 
 
@@ -221,6 +225,8 @@ class GroveVisionAIResult(Entity):
 
 
 class WatcherSensor(Entity):
+    _attr_should_poll = False
+
     def __init__(self, eui: str, type: str):
         """Initialize the sensor.
         
@@ -239,8 +245,13 @@ class WatcherSensor(Entity):
 
     async def async_added_to_hass(self) -> None:
         """Run when this Entity has been added to HA."""
-        self._event = self.hass.bus.async_listen(
-            self._event_type, self.handle_event)
+        if self._type == 'alarm':
+            self._event = self.hass.bus.async_listen(
+                self._event_type, self.handle_event)
+        else:
+            # 传感器读数由 Watcher 直接推送, 不经过事件总线
+            self._event = async_dispatcher_connect(
+                self.hass, watcher_readings_signal(self._eui), self.handle_readings)
 
     async def async_will_remove_from_hass(self) -> None:
         """Entity being removed from hass."""
@@ -249,11 +260,24 @@ class WatcherSensor(Entity):
             self._event = None
 
     def handle_event(self, event):
-        """Handle the event data based on sensor type."""
-        # 报警传感器使用 'text' 字段，其他传感器使用 'value' 字段
-        self._state = event.data.get('text' if self._type == 'alarm' else 'value')
+        """Handle the alarm event."""
+        self._state = event.data.get('text')
+        # Folded repeats of the alarm, see Watcher alarm coalescing
+        self._attr_extra_state_attributes = {
+            key: event.data[key]
+            for key in ('count', 'first_seen', 'last_seen') if key in event.data
+        }
         self.hass.loop.call_soon_threadsafe(self.async_schedule_update_ha_state)
 
+    @callback
+    def handle_readings(self, readings: dict):
+        """Write the state if the reading of this sensor changed."""
+        value = readings.get(self._type)
+        if value is None or value == self._state:
+            return
+        self._state = value
+        self.async_write_ha_state()
+
     @property
     def device_info(self) -> DeviceInfo:
         """Return the device info."""
@@ -272,3 +296,63 @@ class WatcherSensor(Entity):
     def state(self):
         """Return the state of the sensor."""
         return self._state
+
+
+class WatcherStorageSensor(Entity):
+    """Disk space used by the stored images of a Watcher."""
+
+    _attr_unit_of_measurement = UnitOfInformation.MEGABYTES
+    _attr_icon = "mdi:harddisk"
+    _attr_should_poll = False
+
+    def __init__(self, watcher: Watcher):
+        """Initialize the sensor."""
+        self._watcher = watcher
+        self._store = watcher.image_store
+        self._eui = watcher.deviceId
+        self._deviceName = f"watcher_{self._eui}"
+        self._attr_unique_id = f"{self._deviceName}_storage"
+        self._attr_name = self._attr_unique_id
+        self._remove_listener = None
+
+    async def async_added_to_hass(self) -> None:
+        """Run when this Entity has been added to HA."""
+        self._remove_listener = self._store.async_add_listener(
+            self.async_write_ha_state)
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Entity being removed from hass."""
+        if self._remove_listener:
+            self._remove_listener()
+            self._remove_listener = None
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        """Return the device info."""
+        return DeviceInfo(
+            identifiers={
+                (DOMAIN, self._eui)
+            },
+            name=self._deviceName,
+            manufacturer="Seeed Studio",
+            model="Watcher",
+            sw_version="1.0",
+        )
+
+    @property
+    def state(self):
+        """Return the storage used by the device in MB."""
+        used, _ = self._store.usage(self._eui)
+        return round(used / (1024 * 1024), 2)
+
+    @property
+    def extra_state_attributes(self):
+        """Return the image count, quotas and the usage of all devices."""
+        used, images = self._store.usage(self._eui)
+        return {
+            "images": images,
+            "bytes": used,
+            "quota_mb": self._watcher.storage_quota,
+            "total_bytes": self._store.total_bytes,
+            "total_quota_mb": self._store.max_total_bytes // (1024 * 1024),
+        }
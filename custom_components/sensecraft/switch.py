@@ -58,11 +58,9 @@ class ReCameraTrackSwitch(SwitchEntity):
         self._event = self.hass.bus.async_listen(
             self._event_type, self._handle_state_event)
         
-        # 添加连接状态事件监听
-        self._connection_event = self.hass.bus.async_listen(
-            f"sensecraft_recamera_{self._recamera.deviceId}_connection_state",
-            self._handle_connection_state
-        )
+        # 连接状态由 ReCamera 统一维护
+        self._connection_event = self._recamera.availability.async_add_listener(
+            self.async_write_ha_state)
 
     async def async_will_remove_from_hass(self) -> None:
         """Entity being removed from hass."""
@@ -79,11 +77,6 @@ class ReCameraTrackSwitch(SwitchEntity):
         """Return True if entity is available."""
         return self._recamera.connected
     
-    def _handle_connection_state(self, event):
-        """Handle connection state changes."""
-        self._recamera.connected = event.data.get("connected", False)
-        self.hass.loop.call_soon_threadsafe(self.async_schedule_update_ha_state)
-    
     async def _handle_state_event(self, event):
         """处理状态事件"""
         try:
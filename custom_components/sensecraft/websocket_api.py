@@ -0,0 +1,41 @@
+"""WebSocket API for Sensecraft."""
+import voluptuous as vol
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant, callback
+
+from .core.event_index import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from .core.image_store import ImageStore
+
+
+@callback
+def async_setup(hass: HomeAssistant) -> None:
+    """Register the WebSocket commands."""
+    websocket_api.async_register_command(hass, websocket_watcher_events)
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): "sensecraft/watcher/events",
+        vol.Optional("device_id"): str,
+        vol.Optional("start_time"): vol.Coerce(float),
+        vol.Optional("end_time"): vol.Coerce(float),
+        vol.Optional("limit", default=DEFAULT_PAGE_SIZE): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=MAX_PAGE_SIZE)),
+        vol.Optional("cursor"): str,
+    }
+)
+@websocket_api.async_response
+async def websocket_watcher_events(hass: HomeAssistant, connection, msg: dict) -> None:
+    """Return a page of Watcher alarm events by device and time range.
+
+    Times are Unix timestamps, pass next_cursor back to get the next page.
+    """
+    store = ImageStore(hass, hass.config.path('www/images'))
+    try:
+        result = await store.async_query_events(
+            msg.get("device_id"), msg.get("start_time"), msg.get("end_time"),
+            msg["limit"], msg.get("cursor"))
+    except ValueError as e:
+        connection.send_error(msg["id"], websocket_api.ERR_INVALID_FORMAT, str(e))
+        return
+    connection.send_result(msg["id"], result)